@@ -0,0 +1,205 @@
+"""
+Bulk outbound call campaigns with a rate-limited background dialer.
+
+A campaign is a queue of (name, phone number[, config profile]) entries. The dialer places them
+no faster than `calls_per_second`, keeps at most `max_concurrent` calls live at
+once, and retries requests the carrier API rejects with HTTP 429.
+
+A call's slot is released when `Dialer.call_finished()` is called (from the
+Twilio status callback or when its WebSocket closes), or after
+`call_timeout` seconds if neither arrives. With several workers those events
+often reach a worker other than the one dialing, so they are also recorded in
+the session store and the dialer polls it for its live calls
+(`poll_finished`). Finished campaigns are forgotten after `retention` seconds.
+"""
+
+import asyncio
+import logging
+import random
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Terminal Twilio call statuses
+FINISHED_STATUSES = {"completed", "busy", "failed", "no-answer", "canceled"}
+
+
+def is_rate_limited(exc):
+    """Whether an exception from the call API is an HTTP 429"""
+    return getattr(exc, "status", None) == 429
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` acquisitions per second (bursts of up to one second's worth)"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Campaign:
+    """A batch of outbound calls and its progress"""
+
+    def __init__(self, entries, calls_per_second=1.0, max_concurrent=5, profile=""):
+        self.id = uuid.uuid4().hex[:12]
+        self.profile = profile
+        self.entries = [
+            {"name": name, "phoneNumber": phone, "profile": (rest[0] if rest else "") or profile, "status": "queued"}
+            for name, phone, *rest in entries
+        ]
+        self.calls_per_second = calls_per_second
+        self.max_concurrent = max_concurrent
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.retries = 0
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.task = None
+
+    def progress(self):
+        counts = {}
+        for entry in self.entries:
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": len(self.entries),
+            "counts": counts,
+            "retries": self.retries,
+            "callsPerSecond": self.calls_per_second,
+            "maxConcurrentCalls": self.max_concurrent,
+            "profile": self.profile,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+        }
+
+
+class Dialer:
+    """Runs campaigns in the background.
+
+    `place_call` is an async callable taking (name, phone number, profile)
+    and returning the call SID; it should raise an exception with `status == 429`
+    when the API is rate limiting. `poll_finished` is an async callable taking
+    a list of call SIDs and returning {call SID: status} for those that ended
+    elsewhere; it is polled every `poll_interval` seconds while calls are live.
+    """
+
+    def __init__(self, place_call, max_retries=5, backoff=1.0, call_timeout=900,
+                 poll_finished=None, poll_interval=2.0, retention=86400):
+        self.place_call = place_call
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.call_timeout = call_timeout
+        self.poll_finished = poll_finished
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.campaigns = {}
+        self.active_calls = {}  # call SID -> (campaign, entry, timeout handle)
+        self._poller = None
+
+    def submit(self, campaign):
+        """Queue a campaign and start dialing it"""
+        self.campaigns[campaign.id] = campaign
+        campaign.task = asyncio.create_task(self._run(campaign))
+        return campaign
+
+    def cancel(self, campaign_id):
+        """Stop placing new calls for a campaign; calls already live are unaffected"""
+        campaign = self.campaigns.get(campaign_id)
+        if campaign and campaign.task and not campaign.task.done():
+            campaign.task.cancel()
+        return campaign
+
+    def call_finished(self, call_sid, status="completed"):
+        """Release the concurrency slot held by a campaign call; returns whether this dialer placed it"""
+        active = self.active_calls.pop(call_sid, None)
+        if active is None:
+            return False
+        campaign, entry, handle = active
+        handle.cancel()
+        entry["status"] = status
+        campaign.slots.release()
+        return True
+
+    async def _poll(self):
+        while self.active_calls:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                finished = await self.poll_finished(list(self.active_calls))
+            except Exception:
+                logger.exception("Error polling for finished campaign calls")
+                continue
+            for call_sid, status in finished.items():
+                self.call_finished(call_sid, status)
+        self._poller = None
+
+    async def _run(self, campaign):
+        campaign.status = "running"
+        campaign.started_at = time.time()
+        limiter = RateLimiter(campaign.calls_per_second)
+        pending = set()
+        try:
+            for entry in campaign.entries:
+                await campaign.slots.acquire()
+                await limiter.acquire()
+                task = asyncio.create_task(self._dial(campaign, entry, limiter))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+            # Every live call holds a slot, so having them all back means every call has ended
+            for _ in range(campaign.max_concurrent):
+                await campaign.slots.acquire()
+            campaign.status = "completed"
+        except asyncio.CancelledError:
+            campaign.status = "cancelled"
+            for entry in campaign.entries:
+                if entry["status"] == "queued":
+                    entry["status"] = "cancelled"
+        finally:
+            campaign.finished_at = time.time()
+            logger.info("Campaign finished", extra={"campaign": campaign.id, **campaign.progress()["counts"]})
+            asyncio.get_running_loop().call_later(self.retention, self.campaigns.pop, campaign.id, None)
+
+    async def _dial(self, campaign, entry, limiter):
+        """Place one call, retrying 429s with exponential backoff and jitter"""
+        entry["status"] = "dialing"
+        for attempt in range(self.max_retries + 1):
+            try:
+                call_sid = await self.place_call(entry["name"], entry["phoneNumber"], entry["profile"])
+            except Exception as e:
+                if is_rate_limited(e) and attempt < self.max_retries:
+                    campaign.retries += 1
+                    await asyncio.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+                    await limiter.acquire()
+                    continue
+                entry["status"] = "failed"
+                entry["error"] = str(e)
+                campaign.slots.release()
+                return
+            entry["status"] = "in-progress"
+            entry["callSid"] = call_sid
+            handle = asyncio.get_running_loop().call_later(
+                self.call_timeout, self.call_finished, call_sid, "timed-out"
+            )
+            self.active_calls[call_sid] = (campaign, entry, handle)
+            if self.poll_finished is not None and self._poller is None:
+                self._poller = asyncio.create_task(self._poll())
+            return
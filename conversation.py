@@ -0,0 +1,144 @@
+"""
+Per-call conversation history shared by every AI provider.
+
+History is bounded by a token budget: once a call grows past it, the oldest
+turns are dropped from the context window straight away and folded into a
+rolling summary by a background task, so a long call never slows down or
+overflows the model's context.
+"""
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (about four characters per token plus message overhead)"""
+    return len(text) // 4 + 4
+
+
+class Conversation:
+    """Conversation history for a single call.
+
+    `messages` holds OpenAI-style role/content dicts with the system prompt
+    first. Providers may keep derived, incrementally updated state in
+    `provider_state`; `revision` is bumped whenever existing messages are
+    rewritten or evicted so that state knows to rebuild rather than extend.
+
+    `summarizer` is an async callable taking the previous summary and a list
+    of evicted messages and returning the new summary. Without one, evicted
+    turns are simply dropped.
+    """
+
+    def __init__(self, system_prompt, token_budget=0, summarizer=None):
+        self.base_prompt = system_prompt
+        self.messages = [{"role": "system", "content": system_prompt}]
+        self.token_counts = [estimate_tokens(system_prompt)]
+        self.tokens = self.token_counts[0]
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.summary = ""
+        self.revision = 0
+        self.user_turns = 0
+        self.provider_state = {}
+        self._evicted = []
+        self._summary_task = None
+
+    @property
+    def system_prompt(self):
+        return self.base_prompt
+
+    def append(self, role, content):
+        """Add a message to the end of the conversation, compacting if over budget"""
+        self.messages.append({"role": role, "content": content})
+        count = estimate_tokens(content)
+        self.token_counts.append(count)
+        self.tokens += count
+        if role == "user":
+            self.user_turns += 1
+        if self.token_budget and self.tokens > self.token_budget:
+            self._compact()
+
+    def restore(self, messages):
+        """Resume from saved messages (e.g. when a call reconnects to another worker)"""
+        system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        if system.startswith(f"{self.base_prompt}\n\n{SUMMARY_PREFIX} "):
+            self._set_summary(system[len(self.base_prompt) + len(SUMMARY_PREFIX) + 3:])
+        for msg in messages:
+            if msg["role"] in ("user", "assistant"):
+                self.append(msg["role"], msg["content"])
+
+    def fork(self):
+        """Copy of the current history for a speculative turn (no budget, summarizer or provider state)"""
+        other = Conversation(self.base_prompt)
+        other.messages = list(self.messages)
+        other.token_counts = list(self.token_counts)
+        other.tokens = self.tokens
+        other.summary = self.summary
+        other.user_turns = self.user_turns
+        return other
+
+    def truncate_last_assistant(self, utterance):
+        """Cut the last assistant message down to what the caller actually heard"""
+        if len(self.messages) < 2 or self.messages[-1]["role"] != "assistant":
+            return
+        if utterance:
+            self.messages[-1]["content"] = utterance
+            count = estimate_tokens(utterance)
+            self.tokens += count - self.token_counts[-1]
+            self.token_counts[-1] = count
+        else:
+            self.messages.pop()
+            self.tokens -= self.token_counts.pop()
+        self.revision += 1
+
+    def _compact(self):
+        """Evict the oldest turns until the window is back under budget"""
+        # Leave headroom so we don't compact again on the very next turn
+        target = self.token_budget * 3 // 4
+        evicted = []
+        # Always keep the latest message (the prompt being answered)
+        while self.tokens > target and len(self.messages) > 2:
+            evicted.append(self.messages.pop(1))
+            self.tokens -= self.token_counts.pop(1)
+        # Start the window on a user turn so roles stay paired
+        while len(self.messages) > 2 and self.messages[1]["role"] != "user":
+            evicted.append(self.messages.pop(1))
+            self.tokens -= self.token_counts.pop(1)
+
+        if not evicted:
+            return
+        self.revision += 1
+        if self.summarizer:
+            self._evicted.extend(evicted)
+            if self._summary_task is None or self._summary_task.done():
+                self._summary_task = asyncio.create_task(self._summarize())
+
+    async def _summarize(self):
+        """Fold evicted turns into the rolling summary, off the request path"""
+        while self._evicted:
+            evicted, self._evicted = self._evicted, []
+            try:
+                summary = await self.summarizer(self.summary, evicted)
+            except Exception:
+                logger.exception("Error summarizing conversation")
+                continue
+            if summary:
+                self._set_summary(summary.strip())
+
+    def _set_summary(self, summary):
+        self.summary = summary
+        content = f"{self.base_prompt}\n\n{SUMMARY_PREFIX} {summary}"
+        self.messages[0] = {"role": "system", "content": content}
+        count = estimate_tokens(content)
+        self.tokens += count - self.token_counts[0]
+        self.token_counts[0] = count
+        self.revision += 1
+
+    def close(self):
+        """Stop any background summarization for this conversation"""
+        if self._summary_task and not self._summary_task.done():
+            self._summary_task.cancel()
@@ -0,0 +1,160 @@
+"""
+Structured, queue-backed logging.
+
+Log calls on the request path only put a record on an in-memory queue; a
+background thread formats it, tracebacks included, and writes it, so neither
+formatting nor stdout I/O blocks the event loop. If the queue is full the
+record is dropped (and counted) rather than waiting. Every record carries the
+`call_sid` of the call being handled.
+
+Environment:
+  LOG_LEVEL        DEBUG, INFO (default), WARNING, ...
+  LOG_FORMAT       json (default) or text
+  LOG_TRANSCRIPTS  off (default), on, or a sample rate between 0 and 1 that
+                   decides per call whether prompts and responses are logged
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+call_sid_var = contextvars.ContextVar("call_sid", default=None)
+transcripts_var = contextvars.ContextVar("log_transcripts", default=False)
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "call_sid"}
+
+
+class CallContextFilter(logging.Filter):
+    """Attach the current call_sid to every record, unless one was passed via `extra=`"""
+
+    def filter(self, record):
+        if getattr(record, "call_sid", None) is None:
+            record.call_sid = call_sid_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.call_sid:
+            entry["call_sid"] = record.call_sid
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for local development"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(call_sid)s] %(message)s")
+
+    def format(self, record):
+        text = super().format(record)
+        extras = {k: v for k, v in record.__dict__.items() if k not in _RECORD_ATTRS and not k.startswith("_")}
+        if extras:
+            text += " " + " ".join(f"{k}={v}" for k, v in extras.items())
+        return text
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """Resolve only the message; tracebacks are formatted on the listener thread"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue_handler = None
+_listener = None
+_transcript_rate = 0.0
+
+
+def _parse_transcript_rate(value):
+    value = (value or "off").strip().lower()
+    if value in ("on", "true", "yes", "all"):
+        return 1.0
+    if value in ("off", "false", "no", ""):
+        return 0.0
+    return min(max(float(value), 0.0), 1.0)
+
+
+def configure_logging(level=None, fmt=None, transcripts=None, queue_size=10000):
+    """Route the root logger through a background queue listener"""
+    global _queue_handler, _listener, _transcript_rate
+    if _listener is not None:
+        return
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+    _transcript_rate = _parse_transcript_rate(transcripts if transcripts is not None else os.getenv("LOG_TRANSCRIPTS"))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    _queue_handler.addFilter(CallContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records():
+    """Number of log records dropped because the queue was full"""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def bind_call(call_sid):
+    """Tag subsequent log records in this context with call_sid and decide transcript sampling"""
+    call_sid_var.set(call_sid)
+    transcripts_var.set(_transcript_rate >= 1.0 or (_transcript_rate > 0 and random.random() < _transcript_rate))
+
+
+def transcripts_enabled():
+    """Whether prompts and responses for the current call should be logged"""
+    return transcripts_var.get()
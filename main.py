@@ -1,31 +1,80 @@
 import os
-import json
+import re
+import csv
+import io
+import asyncio
+import functools
+import logging
+import time
 import uvicorn
+from xml.sax.saxutils import escape, quoteattr
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
-from fastapi.responses import Response
+from fastapi.responses import PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
+from pydantic import ValidationError
 from pydantic import BaseModel
-from openai import OpenAI
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 
+import logs
+from campaigns import Campaign, Dialer, FINISHED_STATUSES
+from conversation import Conversation
+from messages import END_OF_REPLY, END_SESSION, Error, Interrupt, MessageError, Outbox, Prompt, Setup, decode, text_frame
+from metrics import REGISTRY, TurnTimer
+from prefetch import Prefetch, Speculator
+from profiles import DEFAULT_PROFILE, SessionConfig, profile_for_numbers
+from providers import GeminiProvider, OpenAIProvider, ProviderError, close_providers, get_provider, register_provider
+from response_cache import ResponseCache
+from routing import Router, parse_fallbacks
+from session_manager import SessionManager, resident_memory_bytes
+from session_store import create_session_store
+from speech import speech_chunks, split_for_speech
+from transcripts import create_transcript_sink
+
 # Load environment variables from .env file
 load_dotenv()
 
+# Structured logging through a background queue so log writes never block the event loop
+logs.configure_logging()
+logger = logging.getLogger("voice_assistant")
+
 # Configuration
 PORT = int(os.getenv("PORT", "8080"))
 DOMAIN = os.getenv("NGROK_URL")
 WS_URL = f"wss://{DOMAIN}/ws"
 WELCOME_GREETING = "Hi! I am a voice assistant powered by Twilio and AI. Ask me anything!"
+# Forward partial tokens to ConversationRelay as they arrive instead of one final message
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "true").lower() in ("1", "true", "yes")
+ERROR_RESPONSE = "I'm sorry, I'm having trouble processing your request right now."
+# Approximate token budget for the conversation sent to the model each turn (0 disables windowing)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# Opt-in cache of answers to repeated questions (e.g. "what are your hours")
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+# Only answer the caller's first question from the cache unless set to "all"; later
+# turns usually depend on earlier context that isn't part of the cache key
+RESPONSE_CACHE_SCOPE = os.getenv("RESPONSE_CACHE_SCOPE", "first_turn")
+# Opt-in: ask ConversationRelay for partial transcripts and start generating a reply once
+# one stops changing, so the model is already answering when the caller finishes speaking.
+# The buffered reply is only used if the final prompt is similar enough (streaming mode only).
+SPECULATIVE_PREFETCH = STREAM_RESPONSES and os.getenv("SPECULATIVE_PREFETCH", "false").lower() in ("1", "true", "yes")
+SPECULATIVE_STABLE_MS = int(os.getenv("SPECULATIVE_STABLE_MS", "300"))
+SPECULATIVE_MIN_WORDS = int(os.getenv("SPECULATIVE_MIN_WORDS", "3"))
+SPECULATIVE_SIMILARITY = float(os.getenv("SPECULATIVE_SIMILARITY", "0.9"))
+# Spoken to callers turned away while this worker is at MAX_SESSIONS or MAX_MEMORY_MB
+BUSY_MESSAGE = os.getenv("BUSY_MESSAGE", "Sorry, all of our lines are busy right now. Please call back in a few minutes.")
+# A WebSocket that hasn't sent its setup message after this long is closed
+SETUP_TIMEOUT_SECONDS = float(os.getenv("SETUP_TIMEOUT_SECONDS", "10"))
+SUMMARY_PROMPT = "You maintain a running summary of a phone conversation between a caller and a voice assistant. Merge the previous summary with the new transcript into a short paragraph that keeps names, facts, requests and decisions. Reply with the summary only."
 
-def get_personalized_greeting(call_sid):
+async def get_personalized_greeting(call_sid):
     """Get personalized greeting if user data is available"""
-    if call_sid in user_info and "name" in user_info[call_sid]:
-        name = user_info[call_sid]["name"]
+    info = await session_store.get_call(call_sid)
+    if info and "name" in info:
+        name = info["name"]
         return f"Hi {name}! I am a voice assistant powered by Twilio and AI. Ask me anything!"
     return WELCOME_GREETING
 
@@ -44,28 +93,186 @@ DEFAULT_CONFIG = {
 
 # Personality prompts
 PERSONALITY_PROMPTS = {
-    "helpful": "You are a helpful assistant. This conversation is being translated to voice, so answer carefully. When you respond, please spell out all numbers, for example twenty not 20. Do not include emojis in your responses. Do not include bullet points, asterisks, or special symbols.",
-    "friendly": "You are a friendly and warm companion. You're enthusiastic and supportive in your responses. This conversation is being translated to voice, so answer carefully. When you respond, please spell out all numbers, for example twenty not 20. Do not include emojis in your responses.",
-    "professional": "You are a professional advisor with expertise across many domains. You provide clear, structured, and authoritative responses. This conversation is being translated to voice, so answer carefully. When you respond, please spell out all numbers, for example twenty not 20. Do not include emojis in your responses.",
-    "creative": "You are a creative thinker who approaches problems with imagination and innovation. You like to explore possibilities and think outside the box. This conversation is being translated to voice, so answer carefully. When you respond, please spell out all numbers, for example twenty not 20. Do not include emojis in your responses.",
-    "witty": "You are a witty conversationalist with a good sense of humor. You enjoy clever wordplay and light banter while remaining helpful. This conversation is being translated to voice, so answer carefully. When you respond, please spell out all numbers, for example twenty not 20. Do not include emojis in your responses.",
-    "empathetic": "You are an empathetic listener who shows understanding and compassion. You're particularly good at emotional support and active listening. This conversation is being translated to voice, so answer carefully. When you respond, please spell out all numbers, for example twenty not 20. Do not include emojis in your responses.",
-    "technical": "You are a technical expert who excels at explaining complex concepts clearly. You provide detailed, accurate information with practical examples. This conversation is being translated to voice, so answer carefully. When you respond, please spell out all numbers, for example twenty not 20. Do not include emojis in your responses.",
-    "casual": "You are a casual friend who speaks in a relaxed, informal manner. You're laid-back and easy to talk to. This conversation is being translated to voice, so answer carefully. When you respond, please spell out all numbers, for example twenty not 20. Do not include emojis in your responses."
+    "helpful": "You are a helpful assistant. This conversation is being translated to voice, so answer carefully.",
+    "friendly": "You are a friendly and warm companion. You're enthusiastic and supportive in your responses. This conversation is being translated to voice, so answer carefully.",
+    "professional": "You are a professional advisor with expertise across many domains. You provide clear, structured, and authoritative responses. This conversation is being translated to voice, so answer carefully.",
+    "creative": "You are a creative thinker who approaches problems with imagination and innovation. You like to explore possibilities and think outside the box. This conversation is being translated to voice, so answer carefully.",
+    "witty": "You are a witty conversationalist with a good sense of humor. You enjoy clever wordplay and light banter while remaining helpful. This conversation is being translated to voice, so answer carefully.",
+    "empathetic": "You are an empathetic listener who shows understanding and compassion. You're particularly good at emotional support and active listening. This conversation is being translated to voice, so answer carefully.",
+    "technical": "You are a technical expert who excels at explaining complex concepts clearly. You provide detailed, accurate information with practical examples. This conversation is being translated to voice, so answer carefully.",
+    "casual": "You are a casual friend who speaks in a relaxed, informal manner. You're laid-back and easy to talk to. This conversation is being translated to voice, so answer carefully."
 }
 
-# Initialize AI clients
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Initialize AI providers (async clients with pooled connections and per-provider concurrency limits)
+register_provider("openai", OpenAIProvider(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    base_url=os.getenv("OPENAI_BASE_URL") or None,
+    max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "20"))
+))
 gemini_api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-gemini_client = genai.Client(api_key=gemini_api_key) if gemini_api_key else None
+if gemini_api_key:
+    register_provider("gemini", GeminiProvider(
+        api_key=gemini_api_key,
+        base_url=os.getenv("GEMINI_BASE_URL") or None,
+        max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "20"))
+    ))
+
+# Route each turn to the configured model, failing over to ROUTER_FALLBACKS on errors or a
+# slow first token and optionally hedging after the model's recent p95 time to first token.
+# Fallbacks whose provider has no API key configured are skipped.
+router = Router(
+    fallbacks=parse_fallbacks(os.getenv("ROUTER_FALLBACKS", "openai=gemini-flash,gemini=openai-gpt4o-mini")),
+    first_token_timeout=int(os.getenv("ROUTER_FIRST_TOKEN_TIMEOUT_MS", "4000")) / 1000,
+    turn_deadline=int(os.getenv("ROUTER_TURN_DEADLINE_MS", "20000")) / 1000,
+    chunk_timeout=int(os.getenv("ROUTER_CHUNK_TIMEOUT_MS", "5000")) / 1000,
+    hedge=os.getenv("ROUTER_HEDGE", "false").lower() in ("1", "true", "yes"),
+    hedge_min_delay=int(os.getenv("ROUTER_HEDGE_MIN_DELAY_MS", "300")) / 1000,
+    max_error_rate=float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5")),
+    on_failover=lambda model, reason: LLM_FAILOVERS_TOTAL.inc(model=model, reason=reason),
+    on_hedge=lambda model, hedge, winner: LLM_HEDGES_TOTAL.inc(model=model, winner="hedge" if winner == hedge else "primary")
+)
+
+class StubTwilioHttpClient(TwilioHttpClient):
+    """Send Twilio REST requests to a local stub server (e.g. scripts/fake_twilio.py) instead of api.twilio.com"""
+
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, uri, *args, **kwargs):
+        return super().request(method, re.sub(r"^https://[^/]+", self.base_url, uri), *args, **kwargs)
+
+# Initialize Twilio client (TWILIO_API_BASE points it at a local stub for offline testing)
+twilio_api_base = os.getenv("TWILIO_API_BASE")
+twilio_client = Client(
+    os.getenv("TWILIO_ACCOUNT_SID"),
+    os.getenv("TWILIO_AUTH_TOKEN"),
+    http_client=StubTwilioHttpClient(twilio_api_base) if twilio_api_base else None
+)
+
+# Response cache (embedding-similarity matching uses OpenAI embeddings when a threshold is set)
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500")),
+    ttl=int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")),
+    embedder=get_provider("openai").embed,
+    similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+) if RESPONSE_CACHE_ENABLED else None
 
-# Initialize Twilio client
-twilio_client = Client(os.getenv("TWILIO_ACCOUNT_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
+# Configuration, call metadata and conversation history live in the session store so
+# several uvicorn workers (or nodes) can share them. Set SESSION_STORE_URL=redis://...
+# when running with --workers N; the default in-memory store is single-process only.
+session_store = create_session_store(
+    os.getenv("SESSION_STORE_URL", ""),
+    ttl=int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+)
 
-# Store active sessions and current configuration
-sessions = {}
-user_info = {}  # Store user information for outbound calls
-current_config = DEFAULT_CONFIG.copy()
+# Calls connected to this process. Sessions silent for SESSION_IDLE_TIMEOUT_SECONDS or older than
+# SESSION_MAX_DURATION_SECONDS are ended by a background reaper, which also purges call metadata
+# and history left in the in-memory store by calls that never connected. New calls are turned
+# away with BUSY_MESSAGE while the worker holds MAX_SESSIONS calls or uses MAX_MEMORY_MB (0 = no limit).
+session_manager = SessionManager(
+    max_sessions=int(os.getenv("MAX_SESSIONS", "0")),
+    max_memory_bytes=int(os.getenv("MAX_MEMORY_MB", "0")) * 1024 * 1024,
+    idle_timeout=int(os.getenv("SESSION_IDLE_TIMEOUT_SECONDS", "900")),
+    max_duration=int(os.getenv("SESSION_MAX_DURATION_SECONDS", "14400")),
+    reap_interval=int(os.getenv("SESSION_REAP_INTERVAL_SECONDS", "30")),
+    purge=session_store.purge_expired,
+    on_reject=lambda reason: SESSIONS_REJECTED_TOTAL.inc(reason=reason),
+    on_reap=lambda reason: SESSIONS_REAPED_TOTAL.inc(reason=reason)
+)
+
+# Append-only record of every turn and finished call for later analysis (opt-in).
+# A .db/.sqlite path writes to SQLite, anything else to size-rotated JSONL.
+transcript_sink = create_transcript_sink(
+    os.getenv("TRANSCRIPTS_PATH", ""),
+    max_queue=int(os.getenv("TRANSCRIPTS_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("TRANSCRIPTS_BATCH_SIZE", "200")),
+    fsync=os.getenv("TRANSCRIPTS_FSYNC", "interval"),
+    max_bytes=int(os.getenv("TRANSCRIPTS_MAX_MB", "100")) * 1024 * 1024,
+    backups=int(os.getenv("TRANSCRIPTS_BACKUPS", "10"))
+)
+
+# Latency histograms and gauges exposed on /metrics
+TURN_PREPARE_SECONDS = REGISTRY.histogram(
+    "cr_turn_prepare_seconds",
+    "Prompt received to LLM request start (parsing, config and cache lookup)",
+    ["model"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "cr_llm_first_token_seconds", "LLM request start to first token", ["model"]
+)
+LLM_LAST_TOKEN_SECONDS = REGISTRY.histogram(
+    "cr_llm_last_token_seconds", "LLM request start to last token", ["model"]
+)
+TURN_FIRST_TOKEN_SECONDS = REGISTRY.histogram(
+    "cr_turn_first_token_seconds", "Prompt received to first token from the LLM", ["model"]
+)
+TURN_FIRST_SPOKEN_SECONDS = REGISTRY.histogram(
+    "cr_turn_first_spoken_seconds", "Prompt received to first sentence sent to ConversationRelay", ["model"]
+)
+TURN_SECONDS = REGISTRY.histogram(
+    "cr_turn_seconds", "Prompt received to final frame sent", ["model"]
+)
+TURNS_TOTAL = REGISTRY.counter(
+    "cr_turns_total", "Conversation turns by outcome (completed, cached, interrupted, error)", ["model", "outcome"]
+)
+ACTIVE_SESSIONS = REGISTRY.gauge(
+    "cr_active_sessions", "Conversations in progress on this worker", callback=lambda: len(session_manager)
+)
+SESSIONS_REJECTED_TOTAL = REGISTRY.counter(
+    "cr_sessions_rejected_total", "Calls turned away at capacity by reason (sessions, memory)", ["reason"]
+)
+SESSIONS_REAPED_TOTAL = REGISTRY.counter(
+    "cr_sessions_reaped_total", "Sessions ended by the reaper by reason (idle, duration)", ["reason"]
+)
+REGISTRY.counter(
+    "cr_session_store_purged_total", "Expired call metadata and history entries purged from the session store",
+    callback=lambda: session_manager.purged
+)
+REGISTRY.gauge(
+    "cr_process_resident_memory_bytes", "Resident memory of this worker",
+    callback=lambda: resident_memory_bytes() or 0
+)
+ACTIVE_WEBSOCKETS = REGISTRY.gauge(
+    "cr_active_websockets", "Open ConversationRelay WebSockets on this worker"
+)
+REGISTRY.counter(
+    "cr_log_records_dropped_total", "Log records dropped because the log queue was full",
+    callback=logs.dropped_records
+)
+LLM_FAILOVERS_TOTAL = REGISTRY.counter(
+    "cr_llm_failovers_total", "Turns moved off a model by reason (error, timeout, deadline)", ["model", "reason"]
+)
+LLM_HEDGES_TOTAL = REGISTRY.counter(
+    "cr_llm_hedges_total", "Hedged requests by which request answered first (primary, hedge)", ["model", "winner"]
+)
+SPECULATIVE_PREFETCHES_TOTAL = REGISTRY.counter(
+    "cr_speculative_prefetches_total",
+    "Speculative replies from partial prompts by outcome (reused, restarted, discarded)", ["model", "outcome"]
+)
+SPECULATIVE_DEAD_AIR_SAVED_SECONDS = REGISTRY.histogram(
+    "cr_speculative_dead_air_saved_seconds",
+    "Generation time already spent on a reused speculative reply when the final prompt arrived", ["model"]
+)
+SPECULATIVE_WASTED_TOKENS_TOTAL = REGISTRY.counter(
+    "cr_speculative_wasted_tokens_total",
+    "Streamed chunks generated for speculative replies that were thrown away", ["model"]
+)
+if transcript_sink is not None:
+    REGISTRY.counter("cr_transcript_records_written_total", "Transcript records written to disk",
+                     callback=lambda: transcript_sink.written)
+    REGISTRY.counter("cr_transcript_records_dropped_total", "Transcript records dropped because the queue was full",
+                     callback=lambda: transcript_sink.dropped)
+    REGISTRY.counter("cr_transcript_write_errors_total", "Transcript records lost to write errors",
+                     callback=lambda: transcript_sink.errors)
+    REGISTRY.gauge("cr_transcript_records_pending", "Transcript records waiting to be written",
+                   callback=lambda: transcript_sink.pending())
+if response_cache is not None:
+    REGISTRY.counter("cr_response_cache_hits_total", "Response cache hits (exact and similar)",
+                     callback=lambda: response_cache.hits + response_cache.similar_hits)
+    REGISTRY.counter("cr_response_cache_misses_total", "Response cache misses",
+                     callback=lambda: response_cache.misses)
 
 # Pydantic models
 class ConfigModel(BaseModel):
@@ -79,70 +286,144 @@ class ConfigModel(BaseModel):
     stability: str = "0.5"
     similarity: str = "0.5"
 
+class ProfileModel(ConfigModel):
+    phoneNumbers: list[str] = []
+
 class CallRequest(BaseModel):
     name: str
     phoneNumber: str
+    profile: str = ""
+
+class CampaignRequest(BaseModel):
+    calls: list[CallRequest]
+    profile: str = ""
+    callsPerSecond: float = float(os.getenv("CAMPAIGN_CALLS_PER_SECOND", "1"))
+    maxConcurrentCalls: int = int(os.getenv("CAMPAIGN_MAX_CONCURRENT_CALLS", "5"))
+
+def twilio_configured():
+    """Whether the Twilio credentials and phone number are set"""
+    return bool(os.getenv("TWILIO_ACCOUNT_SID") and os.getenv("TWILIO_AUTH_TOKEN") and os.getenv("TWILIO_PHONE_NUMBER"))
+
+async def place_call(name, phone_number, profile=""):
+    """Place an outbound call and store the caller's details for the greeting and profile; returns the call SID"""
+    # The Twilio client is blocking, so run it in a worker thread instead of on the event loop
+    call = await asyncio.to_thread(
+        twilio_client.calls.create,
+        to=phone_number,
+        from_=os.getenv("TWILIO_PHONE_NUMBER"),
+        url=f"https://{DOMAIN}/twiml",
+        method="GET",
+        status_callback=f"https://{DOMAIN}/api/calls/status",
+        status_callback_event=["completed"]
+    )
+    
+    # Store user info for personalized greeting
+    info = {
+        "name": name,
+        "phone": phone_number
+    }
+    if profile:
+        info["profile"] = profile
+    await session_store.set_call(call.sid, info)
+    return call.sid
+
+# Background dialer for bulk campaigns (retries Twilio 429s with backoff). Calls that end on
+# another worker are picked up from the session store, so campaigns work with --workers N.
+dialer = Dialer(
+    place_call,
+    max_retries=int(os.getenv("CAMPAIGN_MAX_RETRIES", "5")),
+    call_timeout=int(os.getenv("CAMPAIGN_CALL_TIMEOUT_SECONDS", "900")),
+    poll_finished=session_store.pop_finished_calls,
+    retention=int(os.getenv("CAMPAIGN_RETENTION_SECONDS", "86400"))
+)
+
+async def call_finished(call_sid, status="completed"):
+    """Free an outbound call's campaign slot, here or on the worker whose dialer placed it"""
+    if dialer.call_finished(call_sid, status):
+        return
+    try:
+        await session_store.mark_call_finished(call_sid, status)
+    except Exception:
+        logger.exception("Error recording finished call")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the session reaper; release pooled AI provider and session store connections on shutdown"""
+    session_manager.start()
+    yield
+    await session_manager.stop()
+    for campaign in dialer.campaigns.values():
+        dialer.cancel(campaign.id)
+    await close_providers()
+    await session_store.aclose()
+    if transcript_sink is not None:
+        await asyncio.to_thread(transcript_sink.close)
 
 # Create FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Mount static files and templates
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-def get_system_prompt():
-    """Get the current system prompt based on configuration"""
-    if current_config["customPrompt"]:
-        return current_config["customPrompt"]
-    return PERSONALITY_PROMPTS.get(current_config["personality"], PERSONALITY_PROMPTS["helpful"])
+async def get_current_config():
+    """Get the active configuration from the session store"""
+    return await session_store.get_config() or DEFAULT_CONFIG.copy()
+
+def get_system_prompt(config):
+    """Get the system prompt for a configuration"""
+    if config["customPrompt"]:
+        return config["customPrompt"]
+    return PERSONALITY_PROMPTS.get(config["personality"], PERSONALITY_PROMPTS["helpful"])
 
-async def ai_response(messages):
-    """Get a response from the configured AI model"""
+async def resolve_profile(requested="", call_sid=None, numbers=()):
+    """Pick a call's profile and its configuration.
+
+    In order: the profile named by the caller of this function, the one saved
+    with an outbound call, the one serving one of the call's phone numbers,
+    and finally the default configuration.
+    """
+    profiles = await session_store.get_profiles()
+    name = requested
+    if not name and call_sid:
+        name = ((await session_store.get_call(call_sid)) or {}).get("profile")
+    if not name:
+        name = profile_for_numbers(profiles, numbers)
+    if name in profiles:
+        config = {**DEFAULT_CONFIG, **profiles[name]}
+        config.pop("phoneNumbers", None)
+        return name, config
+    if name and name != DEFAULT_PROFILE:
+        logger.warning("Unknown config profile, using the default", extra={"profile": name})
+    return DEFAULT_PROFILE, await get_current_config()
+
+def build_session_config(profile, config):
+    """Freeze a call's configuration with its system prompt and provider"""
     try:
-        if current_config["aiModel"].startswith("openai"):
-            model_map = {
-                "openai-gpt4o-mini": "gpt-4o-mini",
-                "openai-gpt4o": "gpt-4o",
-                "openai-gpt4": "gpt-4"
-            }
-            model = model_map.get(current_config["aiModel"], "gpt-4o-mini")
-            
-            completion = openai_client.chat.completions.create(
-                model=model,
-                messages=messages
-            )
-            return completion.choices[0].message.content
-            
-        elif current_config["aiModel"].startswith("gemini"):
-            if not gemini_client:
-                raise Exception("Gemini API key not configured")
-                
-            model_map = {
-                "gemini-pro": "gemini-2.5-pro",
-                "gemini-flash": "gemini-2.5-flash"
-            }
-            model_name = model_map.get(current_config["aiModel"], "gemini-2.5-flash")
-
-            # Convert conversation history into a single text content payload.
-            conversation_text = ""
-            for msg in messages[1:]:  # Skip system message for now
-                if msg["role"] == "user":
-                    conversation_text += f"User: {msg['content']}\n"
-                elif msg["role"] == "assistant":
-                    conversation_text += f"Assistant: {msg['content']}\n"
-
-            response = gemini_client.models.generate_content(
-                model=model_name,
-                contents=conversation_text or "Hello",
-                config=types.GenerateContentConfig(
-                    system_instruction=messages[0]["content"]
-                )
-            )
-            return response.text
-            
-    except Exception as e:
-        print(f"Error with AI response: {e}")
-        return "I'm sorry, I'm having trouble processing your request right now."
+        provider = get_provider(config["aiModel"])
+    except ProviderError:
+        logger.warning("No provider for configured model", extra={"model": config["aiModel"]})
+        provider = None
+    return SessionConfig.build(profile, config, get_system_prompt(config), provider)
+
+async def ai_response(conversation, ai_model):
+    """Get a response from the configured AI model; raises if every routed model failed"""
+    return await router.complete(ai_model, conversation)
+
+async def ai_response_stream(conversation, ai_model):
+    """Stream a response from the configured AI model, yielding text chunks as they arrive.
+
+    Errors propagate so `respond` can apologise and record the turn as failed.
+    """
+    async for chunk in router.stream(ai_model, conversation):
+        yield chunk
+
+async def summarize_turns(ai_model, summary, turns):
+    """Fold evicted conversation turns into the rolling summary using the call's model"""
+    transcript = "\n".join(f"{msg['role'].capitalize()}: {msg['content']}" for msg in turns)
+    request = Conversation(SUMMARY_PROMPT)
+    request.append("user", f"Previous summary: {summary or 'None'}\n\nNew transcript:\n{transcript}")
+    return await router.complete(ai_model, request)
 
 # Web interface routes
 @app.get("/")
@@ -153,14 +434,70 @@ async def web_interface(request: Request):
 @app.get("/api/config")
 async def get_config():
     """Get current configuration"""
-    return current_config
+    return await get_current_config()
 
 @app.post("/api/config")
 async def update_config(config: ConfigModel):
-    """Update configuration"""
-    global current_config
-    current_config = config.dict()
-    return {"status": "success", "config": current_config}
+    """Update configuration (calls already in progress keep the configuration they started with)"""
+    new_config = config.dict()
+    await session_store.set_config(new_config)
+    # Precompute the TwiML now so /twiml only has to fill in the greeting
+    get_twiml_template(new_config)
+    return {"status": "success", "config": new_config}
+
+@app.get("/api/profiles")
+async def list_profiles():
+    """Named configuration profiles, keyed by name"""
+    return await session_store.get_profiles()
+
+@app.get("/api/profiles/{name}")
+async def get_profile(name: str):
+    """One configuration profile"""
+    profile = (await session_store.get_profiles()).get(name)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@app.put("/api/profiles/{name}")
+async def put_profile(name: str, profile: ProfileModel):
+    """Create or replace a configuration profile and the phone numbers it serves"""
+    if name == DEFAULT_PROFILE:
+        raise HTTPException(status_code=422, detail="The default profile is the global configuration; update it with POST /api/config")
+    new_profile = profile.dict()
+    await session_store.set_profile(name, new_profile)
+    get_twiml_template({k: v for k, v in new_profile.items() if k != "phoneNumbers"}, name)
+    logger.info("Config profile saved", extra={"profile": name, "numbers": len(new_profile["phoneNumbers"])})
+    return {"status": "success", "name": name, "profile": new_profile}
+
+@app.delete("/api/profiles/{name}")
+async def delete_profile(name: str):
+    """Delete a configuration profile; calls in progress are unaffected"""
+    if not await session_store.delete_profile(name):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    twiml_templates.pop(name, None)
+    return {"status": "success"}
+
+async def require_profile(name):
+    """Reject outbound requests naming a profile that does not exist"""
+    if name and name != DEFAULT_PROFILE and name not in await session_store.get_profiles():
+        raise HTTPException(status_code=422, detail=f"Unknown profile '{name}'")
+
+@app.get("/api/cache")
+async def get_cache_stats():
+    """Response cache hit/miss counters"""
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+@app.get("/api/routing")
+async def get_routing_stats():
+    """Rolling time to first token and error rate for every model the router has called"""
+    return router.snapshot()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus-style metrics for this worker"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/api/phone-number")
 async def get_phone_number():
@@ -170,52 +507,133 @@ async def get_phone_number():
 @app.post("/api/call")
 async def make_call(call_request: CallRequest):
     """Initiate an outbound call"""
+    await require_profile(call_request.profile)
+    if session_manager.capacity_error():
+        raise HTTPException(status_code=503, detail="This server is at capacity; try again later.")
     try:
         # Validate Twilio configuration
-        if not os.getenv("TWILIO_ACCOUNT_SID") or not os.getenv("TWILIO_AUTH_TOKEN") or not os.getenv("TWILIO_PHONE_NUMBER"):
+        if not twilio_configured():
             raise HTTPException(status_code=500, detail="Twilio configuration incomplete. Please check your environment variables.")
         
         # Create the call
-        call = twilio_client.calls.create(
-            to=call_request.phoneNumber,
-            from_=os.getenv("TWILIO_PHONE_NUMBER"),
-            url=f"https://{DOMAIN}/twiml",
-            method="GET"
-        )
-        
-        # Store user info for personalized greeting
-        user_info[call.sid] = {
-            "name": call_request.name,
-            "phone": call_request.phoneNumber
-        }
+        call_sid = await place_call(call_request.name, call_request.phoneNumber, call_request.profile)
         
         return {
             "status": "success", 
             "message": f"Call initiated to {call_request.phoneNumber}",
-            "call_sid": call.sid
+            "call_sid": call_sid
         }
         
     except Exception as e:
-        print(f"Error making call: {e}")
+        logger.exception("Error making call")
         raise HTTPException(status_code=500, detail=f"Failed to initiate call: {str(e)}")
 
-def build_voice_attribute():
-    """Build the voice attribute string for TwiML based on current configuration"""
-    if current_config["ttsProvider"] == "default" or not current_config["voiceId"]:
+def parse_campaign_csv(text):
+    """Parse CSV rows with name, phoneNumber (or phone) and optional profile columns into call requests"""
+    calls = []
+    for row in csv.DictReader(io.StringIO(text)):
+        row = {key.strip(): (value or "").strip() for key, value in row.items() if key}
+        calls.append({
+            "name": row.get("name", ""),
+            "phoneNumber": row.get("phoneNumber") or row.get("phone", ""),
+            "profile": row.get("profile", "")
+        })
+    return calls
+
+@app.post("/api/campaigns")
+async def create_campaign(request: Request):
+    """Queue a bulk outbound campaign from a JSON body or a CSV upload"""
+    if not twilio_configured():
+        raise HTTPException(status_code=500, detail="Twilio configuration incomplete. Please check your environment variables.")
+
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("text/csv"):
+            data = {"calls": parse_campaign_csv((await request.body()).decode("utf-8-sig")), **request.query_params}
+        elif content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None:
+                raise HTTPException(status_code=400, detail="Upload a CSV file in the 'file' field")
+            text = (await upload.read()).decode("utf-8-sig")
+            data = {"calls": parse_campaign_csv(text), **{k: v for k, v in form.items() if k != "file"}}
+        else:
+            data = await request.json()
+        campaign_request = CampaignRequest(**data)
+    except (ValidationError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid campaign: {e}")
+
+    if not campaign_request.calls:
+        raise HTTPException(status_code=422, detail="Campaign has no calls")
+    missing = [i for i, call in enumerate(campaign_request.calls, 1) if not call.phoneNumber.strip()]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Calls {missing} have no phoneNumber (a CSV needs a phoneNumber or phone column)")
+    if campaign_request.callsPerSecond <= 0 or campaign_request.maxConcurrentCalls < 1:
+        raise HTTPException(status_code=422, detail="callsPerSecond must be positive and maxConcurrentCalls at least one")
+    for profile in {campaign_request.profile, *(call.profile for call in campaign_request.calls)}:
+        await require_profile(profile)
+
+    campaign = dialer.submit(Campaign(
+        [(call.name, call.phoneNumber, call.profile) for call in campaign_request.calls],
+        calls_per_second=campaign_request.callsPerSecond,
+        max_concurrent=campaign_request.maxConcurrentCalls,
+        profile=campaign_request.profile
+    ))
+    logger.info("Campaign queued", extra={"campaign": campaign.id, "calls": len(campaign.entries)})
+    return campaign.progress()
+
+@app.get("/api/campaigns")
+async def list_campaigns():
+    """Progress of every campaign on this worker"""
+    return [campaign.progress() for campaign in dialer.campaigns.values()]
+
+@app.get("/api/campaigns/{campaign_id}")
+async def get_campaign(campaign_id: str):
+    """Progress of one campaign, including per-call status"""
+    campaign = dialer.campaigns.get(campaign_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return {**campaign.progress(), "calls": campaign.entries}
+
+@app.delete("/api/campaigns/{campaign_id}")
+async def cancel_campaign(campaign_id: str):
+    """Stop dialing the remaining calls of a campaign"""
+    campaign = dialer.cancel(campaign_id)
+    if campaign is None:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign.progress()
+
+@app.post("/api/calls/status")
+async def call_status_callback(request: Request):
+    """Twilio status callback; frees the campaign slot and stored call details when a call ends"""
+    form = await request.form()
+    call_sid = form.get("CallSid", "")
+    call_status = form.get("CallStatus", "")
+    if call_status in FINISHED_STATUSES:
+        await call_finished(call_sid, call_status)
+        # Calls that never connected (busy, no-answer, failed) have no WebSocket to clean up after them
+        if call_sid and session_manager.get(call_sid) is None:
+            await session_store.pop_call(call_sid)
+            await session_store.delete_history(call_sid)
+    return Response(status_code=204)
+
+def build_voice_attribute(config):
+    """Build the voice attribute string for TwiML based on the given configuration"""
+    if config["ttsProvider"] == "default" or not config["voiceId"]:
         return ""
     
-    voice_id = current_config["voiceId"]
+    voice_id = config["voiceId"]
     
     # For ElevenLabs, build the complex voice attribute
-    if current_config["ttsProvider"] == "ElevenLabs":
+    if config["ttsProvider"] == "ElevenLabs":
         # Add model if not default
-        if current_config["elevenLabsModel"] != "flash_v2_5":
-            voice_id += f"-{current_config['elevenLabsModel']}"
+        if config["elevenLabsModel"] != "flash_v2_5":
+            voice_id += f"-{config['elevenLabsModel']}"
         
         # Add voice settings (speed_stability_similarity)
-        speed = current_config["speed"]
-        stability = current_config["stability"] 
-        similarity = current_config["similarity"]
+        speed = config["speed"]
+        stability = config["stability"] 
+        similarity = config["similarity"]
         
         # Ensure decimal format is preserved by converting to float and back to string
         # This ensures "1.0" stays as "1.0" and doesn't become "1"
@@ -237,97 +655,497 @@ def build_voice_attribute():
         # Only add settings if they're not default values
         if speed_formatted != "1.1" or stability_formatted != "0.5" or similarity_formatted != "0.5":
             voice_id += f"-{speed_formatted}_{stability_formatted}_{similarity_formatted}"
-    print(f"Using voice attribute: {voice_id}")
+    logger.debug("Using voice attribute", extra={"voice": voice_id})
     return voice_id
 
-@app.get("/twiml")
-async def twiml_endpoint(request: Request):
-    """Endpoint that returns TwiML for Twilio to connect to the WebSocket"""
-    # Get CallSid from query parameters
-    call_sid = request.query_params.get("CallSid")
-    greeting = get_personalized_greeting(call_sid) if call_sid else WELCOME_GREETING
-    
-    print(f"TwiML request for CallSid: {call_sid}")
-    
-    # Build TTS attributes
-    tts_provider = current_config["ttsProvider"]
-    voice_attr = build_voice_attribute()
-    
-    # Build ConversationRelay attributes
-    relay_attrs = f'url="{WS_URL}" welcomeGreeting="{greeting}"'
-    
-    if tts_provider != "default":
-        relay_attrs += f' ttsProvider="{tts_provider}"'
-        
-    if voice_attr:
-        relay_attrs += f' voice="{voice_attr}"'
-    
-    xml_response = f"""<?xml version="1.0" encoding="UTF-8"?>
+class TwimlTemplate:
+    """TwiML for one configuration profile, precomputed except for the welcome greeting"""
+
+    def __init__(self, config, profile=DEFAULT_PROFILE):
+        self.config = config
+        tts_provider = config["ttsProvider"]
+        voice_attr = build_voice_attribute(config)
+
+        # Build ConversationRelay attributes; every value is XML-escaped
+        extra_attrs = ""
+        if tts_provider != "default":
+            extra_attrs += f" ttsProvider={quoteattr(tts_provider)}"
+        if voice_attr:
+            extra_attrs += f" voice={quoteattr(voice_attr)}"
+        if SPECULATIVE_PREFETCH:
+            extra_attrs += ' partialPrompts="true"'
+
+        self.head = f"""<?xml version="1.0" encoding="UTF-8"?>
     <Response>
       <Connect>
-        <ConversationRelay {relay_attrs} />
+        <ConversationRelay url={quoteattr(WS_URL)} welcomeGreeting="""
+        # Other profiles are passed to the WebSocket setup message as a custom parameter
+        if profile == DEFAULT_PROFILE:
+            relay_end = " />"
+        else:
+            relay_end = f""">
+          <Parameter name="profile" value={quoteattr(profile)} />
+        </ConversationRelay>"""
+        self.tail = f"""{extra_attrs}{relay_end}
       </Connect>
     </Response>"""
+        self.default_xml = self.head + quoteattr(WELCOME_GREETING) + self.tail
+        logger.debug("Generated TwiML template", extra={"tts_provider": tts_provider, "voice": voice_attr})
+
+    def render(self, greeting):
+        """Fill in the (escaped) welcome greeting"""
+        if greeting == WELCOME_GREETING:
+            return self.default_xml
+        return self.head + quoteattr(greeting) + self.tail
+
+# TwiML templates per profile, each rebuilt whenever its configuration changes
+twiml_templates = {}
+
+def get_twiml_template(config, profile=DEFAULT_PROFILE):
+    """Return the precomputed TwiML template for a profile, rebuilding it if the configuration changed"""
+    template = twiml_templates.get(profile)
+    # The comparison also catches updates made through another worker's API
+    if template is None or template.config != config:
+        template = twiml_templates[profile] = TwimlTemplate(config, profile)
+    return template
+
+def busy_twiml():
+    """TwiML that apologizes and hangs up, for calls arriving while the worker is at capacity"""
+    return f'<?xml version="1.0" encoding="UTF-8"?><Response><Say>{escape(BUSY_MESSAGE)}</Say><Hangup/></Response>'
+
+async def render_twiml(params):
+    """TwiML for a call, using the profile chosen for it"""
+    call_sid = params.get("CallSid")
+    greeting = await get_personalized_greeting(call_sid) if call_sid else WELCOME_GREETING
     
-    print(f"Generated TwiML with TTS provider: {tts_provider}, Voice: {voice_attr}")
+    logs.call_sid_var.set(call_sid)
+    logger.info("TwiML request")
     
-    return Response(content=xml_response, media_type="text/xml")
+    if session_manager.admit():
+        return Response(content=busy_twiml(), media_type="text/xml")
+
+    profile, config = await resolve_profile(call_sid=call_sid, numbers=(params.get("To"), params.get("From")))
+    template = get_twiml_template(config, profile)
+    return Response(content=template.render(greeting), media_type="text/xml")
+
+@app.get("/twiml")
+async def twiml_endpoint(request: Request):
+    """Endpoint that returns TwiML for Twilio to connect to the WebSocket"""
+    return await render_twiml(request.query_params)
 
 @app.post("/twiml")
 async def twiml_endpoint_post(request: Request):
-    """Handle POST requests to /twiml endpoint"""
-    return await twiml_endpoint(request)
+    """Handle POST requests to /twiml endpoint (Twilio sends the call parameters as a form)"""
+    return await render_twiml({**request.query_params, **(await request.form())})
+
+async def send_final_frame(outbox, frame, timer):
+    """Queue a turn's last frame and mark frame_sent once the writer has put it on the socket"""
+    if await outbox.put(frame, track=True):
+        timer.mark("frame_sent")
+
+async def timed_chunks(chunks, timer):
+    """Mark the first raw model chunk, before the sentence chunker holds it back"""
+    async for chunk in chunks:
+        timer.mark("first_token")
+        yield chunk
+
+async def stream_response(outbox, conversation, ai_model, tokens, timer, chunks=None):
+    """Forward streamed AI output to the call's outbox sentence by sentence, collecting what was sent into `tokens`"""
+    timer.mark("llm_start")
+
+    if chunks is None:
+        chunks = ai_response_stream(conversation, ai_model)
+    # Whole sentences (or long clauses) with numbers, markdown and emojis rewritten for TTS
+    async for token in speech_chunks(timed_chunks(chunks, timer)):
+        timer.mark("first_spoken")
+        outbox.put(text_frame(token))
+        tokens.append(token)
+    timer.mark("last_token")
+
+    # Close the turn so ConversationRelay knows the response is complete
+    await send_final_frame(outbox, END_OF_REPLY, timer)
+
+def record_turn(timer, ai_model, outcome):
+    """Record per-turn span durations in the latency histograms"""
+    TURNS_TOTAL.inc(model=ai_model, outcome=outcome)
+    spans = (
+        (TURN_PREPARE_SECONDS, "prompt_received", "llm_start"),
+        (LLM_FIRST_TOKEN_SECONDS, "llm_start", "first_token"),
+        (LLM_LAST_TOKEN_SECONDS, "llm_start", "last_token"),
+        (TURN_FIRST_TOKEN_SECONDS, "prompt_received", "first_token"),
+        (TURN_FIRST_SPOKEN_SECONDS, "prompt_received", "first_spoken"),
+        (TURN_SECONDS, "prompt_received", "frame_sent"),
+    )
+    for histogram, start, end in spans:
+        seconds = timer.between(start, end)
+        if seconds is not None:
+            histogram.observe(seconds, model=ai_model)
+
+    first_token = timer.between("prompt_received", "first_token")
+    total = timer.between("prompt_received", "frame_sent")
+    if first_token is not None and total is not None:
+        logger.info("Turn completed", extra={
+            "model": ai_model,
+            "outcome": outcome,
+            "ttft_ms": round(first_token * 1000),
+            "turn_ms": round(total * 1000)
+        })
+
+def is_cacheable(conversation):
+    """Whether this turn may be answered from (and stored in) the response cache"""
+    if response_cache is None:
+        return False
+    return RESPONSE_CACHE_SCOPE == "all" or conversation.user_turns == 1
+
+async def save_history(call_sid, conversation):
+    """Persist the conversation so other workers can pick the call up"""
+    try:
+        await session_store.save_history(call_sid, conversation.messages)
+    except Exception:
+        logger.exception("Error saving conversation history")
+
+def record_transcript(call_sid, record):
+    """Queue a transcript record; never blocks the caller"""
+    if transcript_sink is not None:
+        transcript_sink.record({"ts": time.time(), "call_sid": call_sid, **record})
+
+def span_ms(timer, start, end):
+    seconds = timer.between(start, end)
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+async def respond(outbox, call_sid, conversation, settings, timer, prefetch=None):
+    """Generate and send the assistant reply for the latest user prompt.
+
+    Runs as a task so an interrupt can cancel it mid-generation. Whatever was
+    actually sent is recorded in the conversation, even if the turn is cut short.
+    A `prefetch` generated from the partial prompt is replayed instead of
+    starting a new generation.
+    """
+    tokens = []
+    ai_model = settings.ai_model
+    prompt = conversation.messages[-1]["content"]
+    outcome = "error"
+    speculative = prefetch is not None
+    try:
+        cacheable = is_cacheable(conversation)
+        cached = None
+        if cacheable:
+            try:
+                cached = await response_cache.get(prompt, conversation.system_prompt, ai_model)
+            except Exception:
+                logger.exception("Error reading response cache")
+
+        if cached is not None:
+            tokens.append(cached)
+            timer.mark("first_token")
+            timer.mark("first_spoken")
+            await send_final_frame(outbox, text_frame(cached, last=True), timer)
+            logger.info("Served response from cache")
+            if prefetch is not None:
+                discard_prefetch(prefetch, "discarded")
+                prefetch = None
+                speculative = False
+        elif prefetch is not None:
+            SPECULATIVE_PREFETCHES_TOTAL.inc(model=ai_model, outcome="reused")
+            SPECULATIVE_DEAD_AIR_SAVED_SECONDS.observe(prefetch.head_start(timer.marks["prompt_received"]), model=ai_model)
+            await stream_response(outbox, conversation, ai_model, tokens, timer, chunks=prefetch.replay())
+        elif STREAM_RESPONSES:
+            await stream_response(outbox, conversation, ai_model, tokens, timer)
+        else:
+            timer.mark("llm_start")
+            response = await ai_response(conversation, ai_model)
+            timer.mark("first_token")
+            timer.mark("first_spoken")
+            timer.mark("last_token")
+            # One frame per sentence so TTS can start on the first while the rest arrives
+            sentences = split_for_speech(response) or [response]
+            for sentence in sentences[:-1]:
+                outbox.put(text_frame(sentence))
+                tokens.append(sentence)
+            tokens.append(sentences[-1])
+            await send_final_frame(outbox, text_frame(sentences[-1], last=True), timer)
+        if logs.transcripts_enabled():
+            logger.info("Sent response", extra={"response": "".join(tokens)})
+        outcome = "cached" if cached is not None else "completed"
+        record_turn(timer, ai_model, outcome)
+
+        response = "".join(tokens)
+        if cacheable and cached is None and response:
+            try:
+                await response_cache.put(prompt, conversation.system_prompt, ai_model, response)
+            except Exception:
+                logger.exception("Error writing response cache")
+    except asyncio.CancelledError:
+        logger.info("Response generation cancelled")
+        outcome = "interrupted"
+        TURNS_TOTAL.inc(model=ai_model, outcome=outcome)
+        raise
+    except Exception:
+        logger.exception("Error generating response", extra={"model": ai_model})
+        # Failed turns are counted but kept out of the latency histograms
+        TURNS_TOTAL.inc(model=ai_model, outcome="error")
+        # Only apologise if the caller has not already heard part of an answer
+        if not tokens:
+            outbox.put(text_frame(ERROR_RESPONSE, last=True))
+            tokens.append(ERROR_RESPONSE)
+        elif "frame_sent" not in timer.marks:
+            outbox.put(END_OF_REPLY)
+    finally:
+        if prefetch is not None:
+            prefetch.cancel()
+        if tokens:
+            conversation.append("assistant", "".join(tokens))
+        record_transcript(call_sid, {
+            "type": "turn",
+            "profile": settings.profile,
+            "turn": conversation.user_turns,
+            "model": ai_model,
+            "outcome": outcome,
+            "interrupted": outcome == "interrupted",
+            "speculative": speculative,
+            "prompt": prompt,
+            "response": "".join(tokens),
+            "ttft_ms": span_ms(timer, "prompt_received", "first_token"),
+            "llm_first_token_ms": span_ms(timer, "llm_start", "first_token"),
+            "first_spoken_ms": span_ms(timer, "prompt_received", "first_spoken"),
+            "turn_ms": span_ms(timer, "prompt_received", "frame_sent")
+        })
+    await save_history(call_sid, conversation)
+
+def discard_prefetch(prefetch, outcome):
+    """Cancel a speculative reply and count what it cost"""
+    prefetch.cancel()
+    SPECULATIVE_PREFETCHES_TOTAL.inc(model=prefetch.ai_model, outcome=outcome)
+    SPECULATIVE_WASTED_TOKENS_TOTAL.inc(len(prefetch.tokens), model=prefetch.ai_model)
+
+def create_speculator(conversation, settings, is_busy):
+    """Speculate on partial prompts for this call while no reply is in progress"""
+    async def start(partial):
+        if is_busy():
+            return None
+        ai_model = settings.ai_model
+        # Generate against a copy so the real history only ever holds the final prompt
+        fork = conversation.fork()
+        fork.append("user", partial)
+        logger.debug("Starting speculative reply", extra={"words": len(partial.split())})
+        return Prefetch(partial, ai_model, ai_response_stream(fork, ai_model))
+
+    return Speculator(
+        start,
+        discard_prefetch,
+        stable_delay=SPECULATIVE_STABLE_MS / 1000,
+        min_words=SPECULATIVE_MIN_WORDS,
+        similarity=SPECULATIVE_SIMILARITY
+    )
+
+async def cancel_response(task):
+    """Cancel an in-flight response task and wait for it to record its partial reply"""
+    if task is None or task.done():
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+async def close_websocket(websocket: WebSocket, code=1000):
+    """Close the socket if it is still open"""
+    try:
+        await websocket.close(code=code)
+    except Exception:
+        pass
+
+class CallConnection:
+    """State of one ConversationRelay WebSocket and a handler for each message type.
+
+    The endpoint's reader loop only decodes frames and dispatches them here;
+    replies run as tasks and are sent by the outbox's writer task, so an
+    interrupt is seen as soon as it arrives.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.outbox = Outbox(websocket.send_text)
+        self.call_sid = None
+        self.call_started = None
+        self.settings = None
+        self.session = None
+        self.response_task = None
+        self.speculator = None
+        self.ended = False
+
+    def replying(self):
+        return self.response_task is not None and not self.response_task.done()
+
+    async def dispatch(self, message, received_at):
+        if self.session is None and not isinstance(message, Setup):
+            logger.warning("Ignoring message before setup", extra={"type": type(message).__name__})
+            return
+        if self.session is not None:
+            self.session.touch()
+        await self.HANDLERS[type(message)](self, message, received_at)
+
+    async def on_setup(self, message, received_at):
+        if self.session is not None:
+            logger.warning("Ignoring repeated setup message")
+            return
+        call_sid = self.call_sid = message.call_sid
+        self.call_started = time.time()
+        logs.bind_call(call_sid)
+        logger.info("Setup for call")
+        if session_manager.admit():
+            await self.end(BUSY_MESSAGE)
+            return
+        # Resolve the call's profile once; later config changes don't affect this call
+        profile, config = await resolve_profile(
+            message.custom_parameters.get("profile"),
+            call_sid,
+            (message.to_number, message.from_number)
+        )
+        settings = self.settings = build_session_config(profile, config)
+
+        # Initialize conversation history; providers build per-session state once here
+        conversation = Conversation(
+            settings.system_prompt,
+            token_budget=CONTEXT_TOKEN_BUDGET,
+            summarizer=functools.partial(summarize_turns, settings.ai_model)
+        )
+        # Resume the call if it was already in progress on another worker
+        history = await session_store.get_history(call_sid)
+        if history:
+            conversation.restore(history)
+        self.session = session_manager.open(call_sid, conversation, lambda reason: self.end())
+        if SPECULATIVE_PREFETCH:
+            self.speculator = create_speculator(conversation, settings, self.replying)
+        try:
+            if settings.provider:
+                settings.provider.start_session(conversation)
+        except Exception:
+            logger.exception("Error preparing AI session")
+
+        logger.info("Call configured", extra={
+            "profile": profile, "model": settings.ai_model, "personality": config["personality"]
+        })
+
+    async def on_prompt(self, message, received_at):
+        if not message.last:
+            # Partial transcript while the caller is still speaking (partialPrompts)
+            if self.speculator:
+                self.speculator.on_partial(message.voice_prompt)
+            return
+
+        if logs.transcripts_enabled():
+            logger.info("Processing prompt", extra={"prompt": message.voice_prompt})
+        conversation = self.session.conversation
+
+        # A new prompt supersedes any reply still being generated
+        await cancel_response(self.response_task)
+        prefetch = self.speculator.take(message.voice_prompt) if self.speculator else None
+        conversation.append("user", message.voice_prompt)
+        self.response_task = asyncio.create_task(
+            respond(self.outbox, self.call_sid, conversation, self.settings, TurnTimer(received_at), prefetch)
+        )
+
+    async def on_interrupt(self, message, received_at):
+        logger.info("Handling interruption")
+        await cancel_response(self.response_task)
+        # The caller has moved on; don't send the rest of the interrupted reply
+        self.outbox.clear()
+        if self.speculator:
+            # Anything speculated so far assumed the caller heard the whole reply
+            self.speculator.discard()
+        conversation = self.session.conversation
+        if conversation.messages and conversation.messages[-1]["role"] == "assistant":
+            # The turn record holds the whole reply; note how much of it the caller heard
+            record_transcript(self.call_sid, {
+                "type": "interruption",
+                "turn": conversation.user_turns,
+                "heard": message.utterance_until_interrupt
+            })
+        conversation.truncate_last_assistant(message.utterance_until_interrupt)
+        await save_history(self.call_sid, conversation)
+
+    async def on_error(self, message, received_at):
+        logger.warning("ConversationRelay reported an error", extra={"description": message.description})
+
+    HANDLERS = {Setup: on_setup, Prompt: on_prompt, Interrupt: on_interrupt, Error: on_error}
+
+    async def end(self, message=None):
+        """Optionally say a last message, then ask ConversationRelay to end the call and close the socket"""
+        self.ended = True
+        if message:
+            self.outbox.put(text_frame(message, last=True))
+        self.outbox.put(END_SESSION)
+        await self.outbox.close()
+        await close_websocket(self.websocket)
+
+    async def close(self):
+        """Release the call's state on this worker and in the session store, however the WebSocket ended"""
+        await cancel_response(self.response_task)
+        if self.speculator:
+            self.speculator.close()
+        await self.outbox.close()
+        if self.session is None:
+            return
+        call_sid = self.call_sid
+        session_manager.remove(self.session)
+        conversation = self.session.conversation
+        conversation.close()
+        record_transcript(call_sid, {
+            "type": "call",
+            "profile": self.settings.profile,
+            "model": self.settings.ai_model,
+            "started_at": self.call_started,
+            "duration_s": round(time.time() - self.call_started, 3),
+            "turns": conversation.user_turns,
+            "summary": conversation.summary,
+            # Only what is still in the context window; earlier turns live on in `summary`
+            "windowed_messages": conversation.messages
+        })
+        info = None
+        try:
+            await session_store.delete_history(call_sid)
+            info = await session_store.pop_call(call_sid)
+        except Exception:
+            logger.exception("Error removing call from the session store")
+        # Only outbound calls have stored details; the status callback may already have handled it
+        if info is not None:
+            await call_finished(call_sid)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint for real-time communication"""
     await websocket.accept()
-    call_sid = None
+    ACTIVE_WEBSOCKETS.inc()
+    connection = CallConnection(websocket)
     
     try:
-        while True:
-            data = await websocket.receive_text()
-            message = json.loads(data)
-            
-            if message["type"] == "setup":
-                call_sid = message["callSid"]
-                print(f"Setup for call: {call_sid}")
-                websocket.call_sid = call_sid
-                system_prompt = get_system_prompt()
-                
-                # Initialize conversation history
-                sessions[call_sid] = [{"role": "system", "content": system_prompt}]
-                
-                print(f"Using AI model: {current_config['aiModel']}, Personality: {current_config['personality']}")
-                
-            elif message["type"] == "prompt":
-                print(f"Processing prompt: {message['voicePrompt']}")
-                conversation = sessions[websocket.call_sid]
-                conversation.append({"role": "user", "content": message["voicePrompt"]})
-                
-                response = await ai_response(conversation)
-                conversation.append({"role": "assistant", "content": response})
-                
-                await websocket.send_text(
-                    json.dumps({
-                        "type": "text",
-                        "token": response,
-                        "last": True
-                    })
-                )
-                print(f"Sent response: {response}")
-                
-            elif message["type"] == "interrupt":
-                print("Handling interruption.")
-                
+        while not connection.ended:
+            if connection.session is None:
+                # Don't hold a connection open forever for a setup message that never comes
+                data = await asyncio.wait_for(websocket.receive_text(), SETUP_TIMEOUT_SECONDS)
             else:
-                print(f"Unknown message type received: {message['type']}")
+                data = await websocket.receive_text()
+            received_at = time.perf_counter()
+            try:
+                message = decode(data)
+            except MessageError as e:
+                logger.warning("Ignoring invalid message", extra={"error": str(e)})
+                continue
+            await connection.dispatch(message, received_at)
                 
     except WebSocketDisconnect:
-        print("WebSocket connection closed")
-        if call_sid:
-            sessions.pop(call_sid, None)
-            user_info.pop(call_sid, None)
+        logger.info("WebSocket connection closed")
+    except asyncio.TimeoutError:
+        logger.warning("No setup message received; closing WebSocket")
+        await close_websocket(websocket)
+    except Exception:
+        logger.exception("Error handling WebSocket session")
+        await close_websocket(websocket, code=1011)
+    finally:
+        # Runs however the session ended, so nothing it held outlives the call
+        await connection.close()
+        ACTIVE_WEBSOCKETS.dec()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=PORT)
@@ -0,0 +1,205 @@
+"""
+ConversationRelay WebSocket messages: decoding, validation and outgoing frames.
+
+Incoming frames are parsed with orjson (in requirements.txt; the standard
+library is a slower fallback if it is missing) and turned into typed messages
+by a decoder looked up from the frame's "type". A frame that isn't JSON, has
+an unknown type or lacks a required field raises `MessageError` rather than
+failing somewhere inside the handler. Outgoing text frames only encode the
+token; everything else about them, and frames that never change, is encoded
+once at import.
+
+`Outbox` sends a connection's frames from its own writer task, so a reply
+never waits on the socket and the reader is always free to see an interrupt.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+from typing import Mapping, NamedTuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+    loads = orjson.loads
+
+    def dumps(value):
+        return orjson.dumps(value).decode()
+else:
+    JSON_BACKEND = "json"
+    loads = json.loads
+    dumps = functools.partial(json.dumps, ensure_ascii=False, separators=(",", ":"))
+
+
+class MessageError(ValueError):
+    """An incoming frame that can't be handled"""
+
+
+class Setup(NamedTuple):
+    call_sid: str
+    from_number: str = ""
+    to_number: str = ""
+    custom_parameters: Mapping = {}
+
+
+class Prompt(NamedTuple):
+    voice_prompt: str
+    last: bool = True
+
+
+class Interrupt(NamedTuple):
+    utterance_until_interrupt: str = ""
+
+
+class Error(NamedTuple):
+    description: str = ""
+
+
+def _field(frame, key, kind=str, default=None):
+    """A field of the expected type; null counts as missing"""
+    value = frame.get(key)
+    if value is None:
+        value = default
+    if not isinstance(value, kind):
+        raise MessageError(f"'{frame['type']}' message needs {kind.__name__} '{key}'")
+    return value
+
+
+def _setup(frame):
+    return Setup(
+        _field(frame, "callSid"),
+        _field(frame, "from", default=""),
+        _field(frame, "to", default=""),
+        _field(frame, "customParameters", dict, {})
+    )
+
+
+def _prompt(frame):
+    # Prompts are most of the traffic, so check the common case inline
+    voice_prompt = frame.get("voicePrompt")
+    last = frame.get("last", True)
+    if type(voice_prompt) is str and type(last) is bool:
+        return Prompt(voice_prompt, last)
+    return Prompt(_field(frame, "voicePrompt"), _field(frame, "last", bool, True))
+
+
+def _interrupt(frame):
+    utterance = frame.get("utteranceUntilInterrupt")
+    if type(utterance) is str:
+        return Interrupt(utterance)
+    return Interrupt(_field(frame, "utteranceUntilInterrupt", default=""))
+
+
+def _error(frame):
+    return Error(_field(frame, "description", default=""))
+
+
+DECODERS = {"setup": _setup, "prompt": _prompt, "interrupt": _interrupt, "error": _error}
+
+
+def decode(data):
+    """Parse one incoming frame into a Setup, Prompt, Interrupt or Error message"""
+    try:
+        frame = loads(data)
+    except ValueError as exc:  # json and orjson decode errors are both ValueErrors
+        raise MessageError("Frame is not valid JSON") from exc
+    if not isinstance(frame, dict):
+        raise MessageError("Frame is not a JSON object")
+    kind = frame.get("type")
+    decoder = DECODERS.get(kind) if type(kind) is str else None
+    if decoder is None:
+        raise MessageError(f"Unknown message type {frame.get('type')!r}")
+    return decoder(frame)
+
+
+_TEXT_HEAD = '{"type":"text","token":'
+_TEXT_TAIL = ',"last":false}'
+_TEXT_LAST_TAIL = ',"last":true}'
+
+
+def text_frame(token, last=False):
+    """A text frame for ConversationRelay to speak"""
+    return _TEXT_HEAD + dumps(token) + (_TEXT_LAST_TAIL if last else _TEXT_TAIL)
+
+
+# Closes a streamed reply
+END_OF_REPLY = text_frame("", last=True)
+# Asks ConversationRelay to end the call
+END_SESSION = dumps({"type": "end"})
+
+
+def _resolve(future, value):
+    if future is not None and not future.done():
+        future.set_result(value)
+
+
+class Outbox:
+    """Frames waiting to be sent on one connection, written in order by a dedicated task.
+
+    `send` is the socket's async send function. Once a send fails the socket is
+    treated as gone and later frames are dropped. `put(frame, track=True)`
+    returns a future that resolves to True once the frame has been written to
+    the socket, or False if it was dropped.
+    """
+
+    def __init__(self, send):
+        self.send = send
+        self.queue = asyncio.Queue()
+        self.closed = False
+        self.task = asyncio.create_task(self._run())
+
+    def put(self, frame, track=False):
+        sent = asyncio.get_running_loop().create_future() if track else None
+        if self.closed:
+            _resolve(sent, False)
+        else:
+            self.queue.put_nowait((frame, sent))
+        return sent
+
+    def clear(self):
+        """Drop frames not sent yet, e.g. the rest of an interrupted reply"""
+        while not self.queue.empty():
+            _, sent = self.queue.get_nowait()
+            _resolve(sent, False)
+            self.queue.task_done()
+
+    async def flush(self):
+        """Wait until every queued frame has been sent"""
+        await self.queue.join()
+
+    async def _run(self):
+        while True:
+            frame, sent = await self.queue.get()
+            ok = False
+            try:
+                if not self.closed:
+                    await self.send(frame)
+                    ok = True
+            except Exception:
+                self.closed = True
+                logger.warning("WebSocket send failed; dropping further frames")
+            finally:
+                _resolve(sent, ok)
+                self.queue.task_done()
+
+    async def close(self, timeout=5.0):
+        """Send what is still queued, then stop the writer"""
+        if not self.closed:
+            try:
+                await asyncio.wait_for(self.flush(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Timed out sending queued frames", extra={"frames": self.queue.qsize()})
+        self.closed = True
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.clear()
@@ -0,0 +1,137 @@
+"""
+Speculative reply generation from partial transcripts.
+
+With partial prompts enabled, ConversationRelay sends the caller's words as
+they are recognized (`prompt` frames with `last: false`). Once a partial has
+stopped changing for `stable_delay` seconds, a reply is generated for it in
+the background and buffered, not sent. When the final prompt arrives, the
+buffered reply is replayed if the final text is close enough to the partial
+(word-level similarity of at least `similarity`); otherwise it is cancelled
+and the turn is generated from scratch.
+"""
+
+import asyncio
+import difflib
+import logging
+import time
+
+from response_cache import normalize_utterance
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_similarity(a, b):
+    """Word-level similarity between two utterances, from 0.0 to 1.0"""
+    return difflib.SequenceMatcher(None, normalize_utterance(a).split(), normalize_utterance(b).split()).ratio()
+
+
+class Prefetch:
+    """A reply being generated ahead of time for one partial prompt"""
+
+    def __init__(self, prompt, ai_model, chunks):
+        self.prompt = prompt
+        self.ai_model = ai_model
+        self.tokens = []
+        self.finished = False
+        self.error = None
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._run(chunks))
+
+    async def _run(self, chunks):
+        try:
+            async for token in chunks:
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                self.tokens.append(token)
+                self._changed.set()
+        except Exception as e:
+            # Raised from `replay` once the buffered tokens have been sent
+            self.error = e
+        finally:
+            self.finished = True
+            self._changed.set()
+
+    async def replay(self):
+        """Yield the buffered tokens, then the rest as they arrive; re-raises a generation error"""
+        sent = 0
+        while True:
+            if sent < len(self.tokens):
+                yield self.tokens[sent]
+                sent += 1
+            elif self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                self._changed.clear()
+                await self._changed.wait()
+
+    def head_start(self, received_at):
+        """Seconds of waiting the caller is spared: generation time before the final prompt, up to the first token"""
+        ready_at = min(received_at, self.first_token_at or received_at)
+        return max(ready_at - self.started_at, 0.0)
+
+    def cancel(self):
+        self.task.cancel()
+
+
+class Speculator:
+    """Starts speculative replies for one call from stable partial prompts.
+
+    `start` is an async callable taking the partial prompt and returning a
+    `Prefetch`; `on_discard` is called with each prefetch that is thrown away
+    and the reason ("restarted" or "discarded").
+    """
+
+    def __init__(self, start, on_discard, stable_delay=0.3, min_words=3, similarity=0.9):
+        self.start = start
+        self.on_discard = on_discard
+        self.stable_delay = stable_delay
+        self.min_words = min_words
+        self.similarity = similarity
+        self.prefetch = None
+        self._timer = None
+
+    def on_partial(self, text):
+        """Restart the stability timer for the latest partial prompt"""
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        if len(text.split()) >= self.min_words:
+            self._timer = asyncio.create_task(self._when_stable(text))
+
+    async def _when_stable(self, text):
+        await asyncio.sleep(self.stable_delay)
+        if self.prefetch and prompt_similarity(self.prefetch.prompt, text) >= self.similarity:
+            return
+        self.discard("restarted")
+        try:
+            self.prefetch = await self.start(text)
+        except Exception:
+            logger.exception("Error starting speculative reply")
+
+    def take(self, final_prompt):
+        """Hand over the prefetch if it answers `final_prompt`, discarding it otherwise"""
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        prefetch, self.prefetch = self.prefetch, None
+        if prefetch is None:
+            return None
+        if prompt_similarity(prefetch.prompt, final_prompt) >= self.similarity:
+            return prefetch
+        prefetch.cancel()
+        self.on_discard(prefetch, "restarted")
+        return None
+
+    def discard(self, reason="discarded"):
+        """Cancel any pending or in-flight speculation"""
+        prefetch, self.prefetch = self.prefetch, None
+        if prefetch is not None:
+            prefetch.cancel()
+            self.on_discard(prefetch, reason)
+
+    def close(self):
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        self.discard()
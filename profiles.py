@@ -0,0 +1,49 @@
+"""
+Named configuration profiles and per-call configuration snapshots.
+
+A profile is a full configuration (model, personality, prompt, voice) plus
+the phone numbers it serves, so one deployment can answer several numbers
+with different assistants. The global configuration edited in the web
+interface is the "default" profile.
+
+Each call resolves its profile once, when the call starts, into a
+`SessionConfig`. Later configuration changes never reach calls that are
+already in progress, and turns don't have to look up shared state.
+"""
+
+import re
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
+DEFAULT_PROFILE = "default"
+
+_NOT_DIGITS = re.compile(r"[^\d+]")
+
+
+def normalize_number(number):
+    """Strip formatting so "+1 (555) 123-4567" and "+15551234567" compare equal"""
+    return _NOT_DIGITS.sub("", number or "")
+
+
+def profile_for_numbers(profiles, numbers):
+    """Name of the first profile serving any of the given phone numbers, or None"""
+    wanted = [normalize_number(n) for n in numbers if n]
+    for number in wanted:
+        for name, profile in profiles.items():
+            if number in (normalize_number(n) for n in profile.get("phoneNumbers", ())):
+                return name
+    return None
+
+
+class SessionConfig(NamedTuple):
+    """Configuration for one call, resolved at setup and read-only afterwards"""
+
+    profile: str
+    ai_model: str
+    system_prompt: str
+    config: Mapping
+    provider: Optional[object] = None
+
+    @classmethod
+    def build(cls, profile, config, system_prompt, provider=None):
+        return cls(profile, config["aiModel"], system_prompt, MappingProxyType(dict(config)), provider)
@@ -0,0 +1,228 @@
+"""
+Async LLM provider backends for the voice assistant.
+
+Each provider wraps a native async client with a pooled HTTP connection and a
+concurrency limit, so a slow completion on one call never blocks the event
+loop for every other call. The SDKs' own retries are turned off: the router
+decides when to give up on a provider and fail over.
+"""
+
+import asyncio
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from google import genai
+from google.genai import types
+
+
+class ProviderError(Exception):
+    """Raised when no usable provider is configured for a model"""
+
+
+class LLMProvider:
+    """Base class for async LLM backends.
+
+    Subclasses implement `_stream` and set `model_map`, which maps the
+    `aiModel` values used by the web interface to upstream model names.
+    """
+
+    name = "base"
+    model_map = {}
+    default_model = ""
+
+    def __init__(self, max_concurrency=10):
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    def resolve_model(self, ai_model):
+        """Map a configured aiModel value to the upstream model name"""
+        return self.model_map.get(ai_model, self.default_model)
+
+    def start_session(self, conversation):
+        """Prepare any per-session state when a call is set up"""
+
+    async def stream(self, ai_model, conversation):
+        """Yield response text chunks, waiting for a free slot under the concurrency limit"""
+        async with self.semaphore:
+            async for chunk in self._stream(self.resolve_model(ai_model), conversation):
+                yield chunk
+
+    async def complete(self, ai_model, conversation):
+        """Return the full response text"""
+        chunks = []
+        async for chunk in self.stream(ai_model, conversation):
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    async def _stream(self, model, conversation):
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    async def aclose(self):
+        """Release pooled connections"""
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat completions over a pooled AsyncOpenAI client"""
+
+    name = "openai"
+    model_map = {
+        "openai-gpt4o-mini": "gpt-4o-mini",
+        "openai-gpt4o": "gpt-4o",
+        "openai-gpt4": "gpt-4"
+    }
+    default_model = "gpt-4o-mini"
+
+    def __init__(self, api_key, base_url=None, max_concurrency=10, timeout=30.0):
+        super().__init__(max_concurrency)
+        self.http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency
+            ),
+            timeout=timeout
+        )
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client, max_retries=0)
+
+    async def _stream(self, model, conversation):
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=conversation.messages,
+            stream=True
+        )
+        # Closing the stream aborts the upstream request if the turn is cancelled
+        async with stream:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+
+    async def embed(self, text, model="text-embedding-3-small"):
+        """Return an embedding vector for the text"""
+        async with self.semaphore:
+            result = await self.client.embeddings.create(model=model, input=text)
+        return result.data[0].embedding
+
+    async def aclose(self):
+        await self.client.close()
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini over the async genai client with a pooled httpx client"""
+
+    name = "gemini"
+    model_map = {
+        "gemini-pro": "gemini-2.5-pro",
+        "gemini-flash": "gemini-2.5-flash"
+    }
+    default_model = "gemini-2.5-flash"
+
+    def __init__(self, api_key, base_url=None, max_concurrency=10, timeout=30.0):
+        super().__init__(max_concurrency)
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency
+            ),
+            timeout=timeout
+        )
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(
+                base_url=base_url,
+                httpx_async_client=self.http_client,
+                retry_options=types.HttpRetryOptions(attempts=1)
+            )
+        )
+
+    def start_session(self, conversation):
+        """Build the system instruction once for the whole call"""
+        conversation.provider_state[self.name] = GeminiSession(conversation)
+
+    def _session(self, conversation):
+        session = conversation.provider_state.get(self.name)
+        if session is None:
+            # The call was set up under another provider; start Gemini state now
+            session = GeminiSession(conversation)
+            conversation.provider_state[self.name] = session
+        return session
+
+    async def _stream(self, model, conversation):
+        session = self._session(conversation)
+        stream = await self.client.aio.models.generate_content_stream(
+            model=model,
+            contents=session.sync(conversation),
+            config=session.config
+        )
+        try:
+            async for chunk in stream:
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            # Abort the upstream request if the turn is cancelled
+            await stream.aclose()
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+
+class GeminiSession:
+    """Structured Gemini contents for one call, extended as the conversation grows"""
+
+    ROLES = {"user": "user", "assistant": "model"}
+
+    def __init__(self, conversation):
+        self.system_instruction = conversation.messages[0]["content"]
+        self.config = types.GenerateContentConfig(
+            system_instruction=self.system_instruction
+        )
+        self.contents = []
+        self.synced = 1  # Messages before this index are already in `contents`
+        self.revision = conversation.revision
+
+    def sync(self, conversation):
+        """Append contents for messages added since the last request"""
+        if self.revision != conversation.revision:
+            # Earlier messages were rewritten or evicted, so rebuild
+            self.contents = []
+            self.synced = 1
+            self.revision = conversation.revision
+            # The system instruction only changes when a summary is folded in
+            if conversation.messages[0]["content"] != self.system_instruction:
+                self.system_instruction = conversation.messages[0]["content"]
+                self.config = types.GenerateContentConfig(
+                    system_instruction=self.system_instruction
+                )
+
+        for msg in conversation.messages[self.synced:]:
+            self.contents.append(types.Content(
+                role=self.ROLES[msg["role"]],
+                parts=[types.Part(text=msg["content"])]
+            ))
+        self.synced = len(conversation.messages)
+        return self.contents
+
+
+# Registered providers, keyed by the aiModel prefix they serve
+PROVIDERS = {}
+
+
+def register_provider(prefix, provider):
+    """Register a provider for every aiModel value starting with `prefix`"""
+    PROVIDERS[prefix] = provider
+
+
+def get_provider(ai_model):
+    """Look up the provider that serves the given aiModel value"""
+    for prefix, provider in PROVIDERS.items():
+        if ai_model.startswith(prefix):
+            return provider
+    raise ProviderError(f"No AI provider configured for model '{ai_model}'")
+
+
+async def close_providers():
+    """Close every registered provider's connection pool"""
+    for provider in PROVIDERS.values():
+        await provider.aclose()
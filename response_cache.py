@@ -0,0 +1,138 @@
+"""
+Opt-in cache of AI responses for repeated questions.
+
+Entries are keyed on the normalized caller utterance, the active system prompt
+and the model, evicted least-recently-used beyond `max_entries` and expired
+after `ttl` seconds. With an `embedder` and a `similarity_threshold`, a prompt
+that misses the exact key can still hit a cached answer whose utterance
+embedding is close enough (cosine similarity). Embeddings are normalized once
+when stored, and the similarity scan runs on a worker thread so a miss never
+holds up the event loop. The embedding computed for a miss is reused when its
+response is cached, so each new utterance is embedded only once.
+"""
+
+import asyncio
+import hashlib
+import math
+import operator
+import re
+import time
+from collections import OrderedDict
+
+_PUNCTUATION = re.compile(r"[^\w\s']")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_utterance(text):
+    """Lowercase, drop punctuation and collapse whitespace so trivial variations share a key"""
+    text = _PUNCTUATION.sub(" ", text.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _unit(vector):
+    """Scale a vector to length 1, so cosine similarity is a plain dot product"""
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else None
+
+
+def _closest(vector, candidates, threshold):
+    """Key of the candidate embedding most similar to `vector`, if any reaches `threshold`"""
+    best_key, best_score = None, threshold
+    for key, embedding in candidates:
+        score = sum(map(operator.mul, vector, embedding))
+        if score >= best_score:
+            best_key, best_score = key, score
+    return best_key
+
+
+class ResponseCache:
+    """LRU + TTL response cache with optional embedding-similarity matching"""
+
+    def __init__(self, max_entries=500, ttl=3600, embedder=None, similarity_threshold=0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embedder = embedder
+        self.similarity_threshold = similarity_threshold
+        self.entries = OrderedDict()  # key -> (response, expires_at, unit embedding)
+        self.recent_embeddings = OrderedDict()  # utterance -> unit embedding of a recent miss, for put()
+        self.max_recent_embeddings = 256
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(prompt, system_prompt, model):
+        prompt_hash = hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()
+        return (normalize_utterance(prompt), prompt_hash, model)
+
+    @property
+    def semantic(self):
+        return self.embedder is not None and self.similarity_threshold > 0
+
+    async def get(self, prompt, system_prompt, model):
+        """Return a cached response for the prompt, or None on a miss"""
+        key = self.make_key(prompt, system_prompt, model)
+        now = time.monotonic()
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            del self.entries[key]
+
+        if self.semantic and key[0]:
+            response = await self._get_similar(key, now)
+            if response is not None:
+                self.similar_hits += 1
+                return response
+
+        self.misses += 1
+        return None
+
+    async def _get_similar(self, key, now):
+        """Find the closest cached utterance for the same system prompt and model"""
+        vector = _unit(await self.embedder(key[0]))
+        self.recent_embeddings[key[0]] = vector
+        while len(self.recent_embeddings) > self.max_recent_embeddings:
+            self.recent_embeddings.popitem(last=False)
+        if vector is None:
+            return None
+        # Snapshot on the loop; the thread never touches `entries` while it may change
+        candidates = [
+            (other_key, embedding) for other_key, (_, expires_at, embedding) in self.entries.items()
+            if other_key[1:] == key[1:] and expires_at > now and embedding is not None
+        ]
+        if not candidates:
+            return None
+        best_key = await asyncio.to_thread(_closest, vector, candidates, self.similarity_threshold)
+        entry = self.entries.get(best_key) if best_key is not None else None
+        if entry is None:  # No match, or evicted while the scan ran
+            return None
+        self.entries.move_to_end(best_key)
+        return entry[0]
+
+    async def put(self, prompt, system_prompt, model, response):
+        """Cache a complete response"""
+        key = self.make_key(prompt, system_prompt, model)
+        if not key[0]:
+            return
+        embedding = None
+        if self.semantic:
+            if key[0] in self.recent_embeddings:
+                embedding = self.recent_embeddings.pop(key[0])
+            else:
+                embedding = _unit(await self.embedder(key[0]))
+        self.entries[key] = (response, time.monotonic() + self.ttl, embedding)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "similarHits": self.similar_hits,
+            "misses": self.misses
+        }
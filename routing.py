@@ -0,0 +1,252 @@
+"""
+Latency-aware routing of LLM requests across providers.
+
+The router keeps a rolling window of time-to-first-token and errors for every
+model it calls. Each turn goes to the configured model first; if it fails, or
+produces nothing within `first_token_timeout`, the request fails over to the
+model's fallbacks in order. With hedging enabled, a second request is sent to
+the next fallback once the first has been silent for longer than its recent
+p95 time to first token, and whichever answers first is used. No turn waits
+longer than `turn_deadline` for its first token, and a reply that goes
+quiet for `chunk_timeout` between chunks is ended there, so a stalled
+upstream never leaves the caller waiting while long answers still finish.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from providers import PROVIDERS, ProviderError, get_provider
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class ModelStats:
+    """Rolling time-to-first-token and error rate for one model"""
+
+    def __init__(self, window=100):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)  # True for success
+
+    def record_success(self, first_token_seconds):
+        self.latencies.append(first_token_seconds)
+        self.outcomes.append(True)
+
+    def record_failure(self):
+        self.outcomes.append(False)
+
+    def percentile(self, p):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def snapshot(self):
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "samples": len(self.outcomes),
+            "errorRate": round(self.error_rate(), 3),
+            "firstTokenP50Ms": round(p50 * 1000) if p50 is not None else None,
+            "firstTokenP95Ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+
+class _Attempt:
+    """One upstream request, pumped into a queue so it can be raced and timed out"""
+
+    def __init__(self, ai_model, conversation):
+        self.ai_model = ai_model
+        self.started = time.perf_counter()
+        self.first = asyncio.get_running_loop().create_future()  # First chunk, or the exception
+        self.chunks = asyncio.Queue()
+        self.task = asyncio.create_task(self._pump(conversation))
+
+    async def _pump(self, conversation):
+        try:
+            async for chunk in get_provider(self.ai_model).stream(self.ai_model, conversation):
+                if not self.first.done():
+                    self.first.set_result(chunk)
+                else:
+                    self.chunks.put_nowait(chunk)
+        except Exception as e:
+            self._finish(e)
+        else:
+            self._finish(ProviderError(f"Empty response from {self.ai_model}") if not self.first.done() else _DONE)
+
+    def _finish(self, result):
+        if not self.first.done():
+            self.first.set_result(result)
+        else:
+            self.chunks.put_nowait(result)
+
+    def cancel(self):
+        self.task.cancel()
+
+
+class Router:
+    """Route each turn to the configured model, failing over and hedging across fallbacks.
+
+    `fallbacks` maps an aiModel value (or a prefix such as "openai") to the
+    aiModel values to try after it. `on_failover` is called with
+    (model, reason) when a model is abandoned for a turn ("error", "timeout"
+    or "deadline"), and `on_hedge` with (model, hedge model, winning model)
+    when a hedged request settles.
+    """
+
+    def __init__(self, fallbacks=None, first_token_timeout=4.0, turn_deadline=20.0, chunk_timeout=5.0, hedge=False,
+                 hedge_min_delay=0.3, max_error_rate=0.5, min_samples=20, on_failover=None, on_hedge=None):
+        self.fallbacks = fallbacks or {}
+        self.first_token_timeout = first_token_timeout
+        self.turn_deadline = turn_deadline
+        self.chunk_timeout = chunk_timeout
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.on_failover = on_failover
+        self.on_hedge = on_hedge
+        self.stats = {}
+
+    def model_stats(self, ai_model):
+        if ai_model not in self.stats:
+            self.stats[ai_model] = ModelStats()
+        return self.stats[ai_model]
+
+    def candidates(self, ai_model):
+        """Models to try for a turn, in order; models with a high recent error rate go last"""
+        backups = self.fallbacks.get(ai_model)
+        if backups is None:
+            backups = next((models for prefix, models in self.fallbacks.items() if ai_model.startswith(prefix)), [])
+        models = []
+        for model in [ai_model, *backups]:
+            if model not in models and any(model.startswith(prefix) for prefix in PROVIDERS):
+                models.append(model)
+        healthy = [m for m in models if not self._unhealthy(m)]
+        return healthy + [m for m in models if m not in healthy]
+
+    def _unhealthy(self, ai_model):
+        stats = self.stats.get(ai_model)
+        return stats is not None and len(stats.outcomes) >= self.min_samples and stats.error_rate() > self.max_error_rate
+
+    def hedge_delay(self, ai_model):
+        """How long to wait for a first token before sending a hedged request"""
+        stats = self.stats.get(ai_model)
+        if stats is None or len(stats.latencies) < self.min_samples:
+            return self.first_token_timeout / 2
+        return max(stats.percentile(95), self.hedge_min_delay)
+
+    def _failover(self, attempt, reason):
+        self.model_stats(attempt.ai_model).record_failure()
+        logger.warning("AI model failed over", extra={"model": attempt.ai_model, "reason": reason})
+        if self.on_failover:
+            self.on_failover(attempt.ai_model, reason)
+
+    async def stream(self, ai_model, conversation):
+        """Yield response chunks from the first model to answer within the turn deadline, until it ends or stalls"""
+        remaining = self.candidates(ai_model)
+        if not remaining:
+            raise ProviderError(f"No AI provider configured for model '{ai_model}'")
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.turn_deadline
+        attempts = [_Attempt(remaining.pop(0), conversation)]
+        live = list(attempts)
+        hedged = None
+        winner = None
+        last_error = None
+        try:
+            while winner is None:
+                if not live:
+                    if not remaining:
+                        raise last_error or ProviderError("No AI model answered")
+                    attempt = _Attempt(remaining.pop(0), conversation)
+                    attempts.append(attempt)
+                    live.append(attempt)
+
+                now = time.perf_counter()
+                wake = min(a.started + self.first_token_timeout for a in live) - now
+                if self.hedge and hedged is None and remaining and len(live) == 1:
+                    wake = min(wake, live[0].started + self.hedge_delay(live[0].ai_model) - now)
+                wake = min(wake, deadline - loop.time())
+                done, _ = await asyncio.wait([a.first for a in live], timeout=max(wake, 0),
+                                             return_when=asyncio.FIRST_COMPLETED)
+
+                for attempt in [a for a in live if a.first in done]:
+                    result = attempt.first.result()
+                    if isinstance(result, Exception):
+                        live.remove(attempt)
+                        last_error = result
+                        self._failover(attempt, "error")
+                    elif winner is None:
+                        winner = attempt
+                if winner is not None or done:
+                    continue
+
+                if loop.time() >= deadline:
+                    for attempt in live:
+                        self._failover(attempt, "deadline")
+                    raise asyncio.TimeoutError("AI turn deadline exceeded")
+                now = time.perf_counter()
+                for attempt in [a for a in live if now - a.started >= self.first_token_timeout]:
+                    attempt.cancel()
+                    live.remove(attempt)
+                    last_error = asyncio.TimeoutError(f"No first token from {attempt.ai_model}")
+                    self._failover(attempt, "timeout")
+                if self.hedge and hedged is None and remaining and len(live) == 1 \
+                        and now - live[0].started >= self.hedge_delay(live[0].ai_model):
+                    hedged = _Attempt(remaining.pop(0), conversation)
+                    attempts.append(hedged)
+                    live.append(hedged)
+                    logger.info("Hedging AI request", extra={"model": live[0].ai_model, "hedge": hedged.ai_model})
+
+            self.model_stats(winner.ai_model).record_success(time.perf_counter() - winner.started)
+            if hedged is not None and self.on_hedge:
+                self.on_hedge(attempts[0].ai_model, hedged.ai_model, winner.ai_model)
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt.cancel()
+
+            yield winner.first.result()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(winner.chunks.get(), self.chunk_timeout)
+                except asyncio.TimeoutError:
+                    self.model_stats(winner.ai_model).record_failure()
+                    logger.warning("AI response stalled mid-way", extra={"model": winner.ai_model})
+                    return
+                if chunk is _DONE:
+                    return
+                if isinstance(chunk, Exception):
+                    self.model_stats(winner.ai_model).record_failure()
+                    raise chunk
+                yield chunk
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def complete(self, ai_model, conversation):
+        """Return the full response text"""
+        chunks = []
+        async for chunk in self.stream(ai_model, conversation):
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    def snapshot(self):
+        return {model: stats.snapshot() for model, stats in self.stats.items()}
+
+
+def parse_fallbacks(value):
+    """Parse "openai=gemini-flash,gemini=openai-gpt4o-mini|openai-gpt4o" into a fallback map"""
+    fallbacks = {}
+    for entry in (value or "").split(","):
+        model, _, backups = entry.partition("=")
+        if model.strip() and backups.strip():
+            fallbacks[model.strip()] = [b.strip() for b in backups.split("|") if b.strip()]
+    return fallbacks
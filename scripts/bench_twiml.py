@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark /twiml generation: per-request build (before) vs precomputed template (after).
+
+Examples:
+  python scripts/bench_twiml.py
+  python scripts/bench_twiml.py --requests 20000 --tts ElevenLabs --name "Ann & Bob"
+
+Notes:
+- "render" times only TwiML generation; "endpoint" drives the full /twiml route
+  in-process through httpx's ASGI transport (no network), with the template
+  rebuilt on every request (before) and reused (after)
+- Uses dummy credentials; no external service is contacted
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ.setdefault("NGROK_URL", "example.ngrok.io")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx  # noqa: E402
+
+import main as app_main  # noqa: E402
+
+
+def legacy_render(config, greeting):
+    """TwiML generation as it worked before the template cache (voice attribute rebuilt per request)"""
+    tts_provider = config["ttsProvider"]
+    voice_attr = app_main.build_voice_attribute(config)
+    relay_attrs = f'url="{app_main.WS_URL}" welcomeGreeting="{greeting}"'
+    if tts_provider != "default":
+        relay_attrs += f' ttsProvider="{tts_provider}"'
+    if voice_attr:
+        relay_attrs += f' voice="{voice_attr}"'
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+    <Response>
+      <Connect>
+        <ConversationRelay {relay_attrs} />
+      </Connect>
+    </Response>"""
+
+
+def template_render(config, greeting):
+    return app_main.get_twiml_template(config).render(greeting)
+
+
+def bench_render(render, config, greeting, n):
+    started = time.perf_counter()
+    for _ in range(n):
+        render(config, greeting)
+    return n / (time.perf_counter() - started)
+
+
+async def bench_endpoint(n, call_sid):
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        params = {"CallSid": call_sid} if call_sid else {}
+        await client.get("/twiml", params=params)  # warm up
+        started = time.perf_counter()
+        for _ in range(n):
+            await client.get("/twiml", params=params)
+        return n / (time.perf_counter() - started)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark /twiml generation before and after template precomputation")
+    parser.add_argument("--requests", type=int, default=50000, help="Renders per measurement (endpoint uses a tenth)")
+    parser.add_argument("--tts", default="ElevenLabs", choices=["default", "Google", "amazon", "ElevenLabs"], help="TTS provider to configure")
+    parser.add_argument("--name", default="", help="Caller name for a personalized greeting (tests escaping)")
+    args = parser.parse_args()
+
+    config = dict(app_main.DEFAULT_CONFIG)
+    if args.tts != "default":
+        config.update(ttsProvider=args.tts, voiceId="UgBBYS2sOqTuMpoF3BR0", speed="1.0")
+    asyncio.run(app_main.session_store.set_config(config))
+
+    call_sid = None
+    greeting = app_main.WELCOME_GREETING
+    if args.name:
+        call_sid = "CAbench"
+        asyncio.run(app_main.session_store.set_call(call_sid, {"name": args.name}))
+        greeting = asyncio.run(app_main.get_personalized_greeting(call_sid))
+
+    before = bench_render(legacy_render, config, greeting, args.requests)
+    after = bench_render(template_render, config, greeting, args.requests)
+    endpoint_requests = max(args.requests // 10, 1)
+    cached_template = app_main.get_twiml_template
+    app_main.get_twiml_template = app_main.TwimlTemplate  # rebuild on every request
+    endpoint_before = asyncio.run(bench_endpoint(endpoint_requests, call_sid))
+    app_main.get_twiml_template = cached_template
+    endpoint_after = asyncio.run(bench_endpoint(endpoint_requests, call_sid))
+
+    print("TwiML render benchmark")
+    print(f"TTS provider: {args.tts}, greeting: {'personalized' if args.name else 'default'}")
+    print(f"Render before (per-request build): {before:,.0f} renders/s")
+    print(f"Render after (precomputed template): {after:,.0f} renders/s ({after / before:.1f}x)")
+    print(f"/twiml before: {endpoint_before:,.0f} requests/s")
+    print(f"/twiml after: {endpoint_after:,.0f} requests/s ({endpoint_after / endpoint_before:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -10,18 +10,35 @@ Examples:
   python scripts/call_count.py --start 2025-01-01 --end 2025-01-31 --inbound
   python scripts/call_count.py --start 2025-01-01 --end 2025-01-31 --outbound
 
+  # Per-day counts and a status breakdown, as JSON
+  python scripts/call_count.py --start 2025-01-01 --end 2025-01-31 --per-day --status-breakdown --json
+
 Notes:
 - Reads TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER from .env
 - Times are interpreted as UTC unless an offset (e.g., +02:00) or 'Z' is provided
+- The range is split into one shard per day and direction, fetched in parallel
+  (--workers). Fetched calls are cached in SQLite (--cache, default
+  .call_count_cache.sqlite); a day is only downloaded again until it has been
+  over for four hours (Twilio's maximum call length), so later runs only fetch
+  recent days. Use --refresh to ignore the cache or --no-cache to skip it
 """
 
 import argparse
+import json
 import os
-from datetime import date, datetime, time, timezone
+import sqlite3
+import sys
+import time as timer
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, time, timedelta, timezone
 
 from dotenv import load_dotenv
 from twilio.rest import Client
 
+# Calls last at most four hours, so a day's records stop changing this long after it ends
+SETTLE = timedelta(hours=4)
+DIRECTIONS = ("inbound", "outbound")
+
 
 def _parse_dt(value: str, end_of_day: bool = False) -> datetime:
     """Parse ISO-like date or datetime string into a UTC, naive datetime.
@@ -63,6 +80,114 @@ def _parse_dt(value: str, end_of_day: bool = False) -> datetime:
     return dt.astimezone(timezone.utc).replace(tzinfo=None)
 
 
+def _utc_naive(dt):
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _format_duration(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def day_shards(start_dt, end_dt):
+    """Every UTC day touched by the range"""
+    day = start_dt.date()
+    while day <= end_dt.date():
+        yield day
+        day += timedelta(days=1)
+
+
+class CallCache:
+    """SQLite cache of call records, filled one (number, direction, day) shard at a time"""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS calls (
+                sid TEXT, number TEXT, direction TEXT, start_time TEXT, status TEXT, duration INTEGER,
+                PRIMARY KEY (sid, number, direction)
+            );
+            CREATE INDEX IF NOT EXISTS calls_start ON calls (number, direction, start_time);
+            CREATE TABLE IF NOT EXISTS shards (
+                number TEXT, direction TEXT, day TEXT, fetched_at TEXT,
+                PRIMARY KEY (number, direction, day)
+            );
+            """
+        )
+
+    def is_final(self, number, direction, day):
+        """Whether the shard was fetched after its calls could no longer change"""
+        row = self.db.execute(
+            "SELECT fetched_at FROM shards WHERE number = ? AND direction = ? AND day = ?",
+            (number, direction, day.isoformat())
+        ).fetchone()
+        day_end = datetime.combine(day + timedelta(days=1), time())
+        return row is not None and datetime.fromisoformat(row[0]) >= day_end + SETTLE
+
+    def store(self, number, direction, day, calls, fetched_at):
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO calls VALUES (?, ?, ?, ?, ?, ?)",
+                [(sid, number, direction, start, status, duration) for sid, start, status, duration in calls]
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO shards VALUES (?, ?, ?, ?)",
+                (number, direction, day.isoformat(), fetched_at.isoformat())
+            )
+
+    def query(self, number, direction, start_dt, end_dt):
+        """(start_time, status, duration) for cached calls in the range"""
+        return self.db.execute(
+            "SELECT start_time, status, duration FROM calls "
+            "WHERE number = ? AND direction = ? AND start_time >= ? AND start_time <= ?",
+            (number, direction, start_dt.isoformat(timespec="seconds"), end_dt.isoformat(timespec="seconds"))
+        ).fetchall()
+
+    def close(self):
+        self.db.close()
+
+
+def fetch_shard(client, number, direction, day):
+    """Download one day of calls in one direction from Twilio"""
+    day_start = datetime.combine(day, time())
+    filters = {"to": number} if direction == "inbound" else {"from_": number}
+    calls = []
+    for call in client.calls.stream(
+        start_time_after=day_start,
+        start_time_before=day_start + timedelta(days=1),
+        page_size=1000,
+        **filters
+    ):
+        start = _utc_naive(call.start_time) if call.start_time else day_start
+        calls.append((call.sid, start.isoformat(timespec="seconds"), call.status, int(call.duration or 0)))
+    return calls
+
+
+def aggregate(rows, per_day):
+    """Counts, durations, statuses and (optionally) per-day counts for one direction"""
+    statuses = {}
+    days = {}
+    duration = 0
+    for start_time, status, seconds in rows:
+        statuses[status] = statuses.get(status, 0) + 1
+        duration += seconds
+        if per_day:
+            day = days.setdefault(start_time[:10], {"count": 0, "duration": 0})
+            day["count"] += 1
+            day["duration"] += seconds
+    answered = sum(1 for _, _, seconds in rows if seconds)
+    return {
+        "count": len(rows),
+        "durationSeconds": duration,
+        "averageDurationSeconds": round(duration / answered, 1) if answered else 0,
+        "statuses": dict(sorted(statuses.items())),
+        "days": dict(sorted(days.items())),
+    }
+
+
 def main() -> int:
     load_dotenv()
 
@@ -101,6 +226,38 @@ def main() -> int:
         action="store_true",
         help="Show count by Twilio call status in addition to totals",
     )
+    parser.add_argument(
+        "--per-day",
+        action="store_true",
+        help="Show counts and talk time for each UTC day",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the results as JSON",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Day shards fetched from Twilio in parallel (default: 8)",
+    )
+    parser.add_argument(
+        "--cache",
+        default=os.getenv("CALL_COUNT_CACHE", ".call_count_cache.sqlite"),
+        help="SQLite file caching fetched calls (default: .call_count_cache.sqlite)",
+    )
+    cache_group = parser.add_mutually_exclusive_group()
+    cache_group.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Download every day again, updating the cache",
+    )
+    cache_group.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Don't read or write the cache file",
+    )
 
     args = parser.parse_args()
 
@@ -116,68 +273,83 @@ def main() -> int:
         return 2
 
     client = Client(account_sid, auth_token)
-
-    # Build common time filters
-    time_filters = {
-        "start_time_after": start_dt,
-        "start_time_before": end_dt,
-    }
-
-    inbound_count = 0
-    outbound_count = 0
-    status_counts_in = {}
-    status_counts_out = {}
+    cache = CallCache(":memory:" if args.no_cache else args.cache)
 
     # Determine which directions to include. Default is both (all).
-    include_inbound = True
-    include_outbound = True
+    directions = list(DIRECTIONS)
     if args.inbound:
-        include_outbound = False
+        directions = ["inbound"]
     elif args.outbound:
-        include_inbound = False
-
-    if include_inbound:
-        for call in client.calls.stream(to=twilio_number, **time_filters):
-            inbound_count += 1
-            if args.status_breakdown:
-                status_counts_in[call.status] = status_counts_in.get(call.status, 0) + 1
-
-    if include_outbound:
-        for call in client.calls.stream(from_=twilio_number, **time_filters):
-            outbound_count += 1
-            if args.status_breakdown:
-                status_counts_out[call.status] = status_counts_out.get(call.status, 0) + 1
-
-    # Compute total and human-readable direction label
-    if include_inbound and include_outbound:
-        direction_label = "all"
-        total = inbound_count + outbound_count
-    elif include_inbound:
-        direction_label = "inbound"
-        total = inbound_count
-    else:
-        direction_label = "outbound"
-        total = outbound_count
+        directions = ["outbound"]
+
+    shards = [
+        (direction, day)
+        for direction in directions
+        for day in day_shards(start_dt, end_dt)
+        if args.refresh or args.no_cache or not cache.is_final(twilio_number, direction, day)
+    ]
+    started = timer.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+        futures = {
+            pool.submit(fetch_shard, client, twilio_number, direction, day): (direction, day)
+            for direction, day in shards
+        }
+        # Only this thread writes to SQLite; workers just download
+        for future in as_completed(futures):
+            direction, day = futures[future]
+            fetched_at = datetime.now(timezone.utc).replace(tzinfo=None)
+            cache.store(twilio_number, direction, day, future.result(), fetched_at)
+    elapsed = timer.perf_counter() - started
+
+    results = {
+        direction: aggregate(cache.query(twilio_number, direction, start_dt, end_dt), args.per_day)
+        for direction in directions
+    }
+    cache.close()
+    total = sum(result["count"] for result in results.values())
+    direction_label = "all" if len(directions) == 2 else directions[0]
+    shard_count = len(directions) * len(list(day_shards(start_dt, end_dt)))
+
+    if args.json:
+        print(json.dumps({
+            "number": twilio_number,
+            "start": start_dt.isoformat(),
+            "end": end_dt.isoformat(),
+            "direction": direction_label,
+            "total": total,
+            **results,
+            "shards": {"total": shard_count, "fetched": len(shards), "seconds": round(elapsed, 2)},
+        }, indent=2))
+        return 0
 
     print("Twilio call count")
     print(f"Number: {twilio_number}")
     print(f"Range (UTC): {start_dt.isoformat()} -> {end_dt.isoformat()}")
     print(f"Direction: {direction_label}")
 
-    if include_inbound:
-        print(f"Inbound (to {twilio_number}): {inbound_count}")
-        if args.status_breakdown and status_counts_in:
-            for k in sorted(status_counts_in.keys()):
-                print(f"  - {k}: {status_counts_in[k]}")
-
-    if include_outbound:
-        print(f"Outbound (from {twilio_number}): {outbound_count}")
-        if args.status_breakdown and status_counts_out:
-            for k in sorted(status_counts_out.keys()):
-                print(f"  - {k}: {status_counts_out[k]}")
+    for direction in directions:
+        result = results[direction]
+        label = f"Inbound (to {twilio_number})" if direction == "inbound" else f"Outbound (from {twilio_number})"
+        print(f"{label}: {result['count']}")
+        print(f"  Talk time: {_format_duration(result['durationSeconds'])}"
+              f" (average {_format_duration(result['averageDurationSeconds'])} per answered call)")
+        if args.status_breakdown and result["statuses"]:
+            for k, v in result["statuses"].items():
+                print(f"  - {k}: {v}")
 
     print(f"Total: {total}")
 
+    if args.per_day:
+        print("Per day (UTC):")
+        days = sorted({day for result in results.values() for day in result["days"]})
+        for day in days:
+            counts = "  ".join(
+                f"{direction} {results[direction]['days'].get(day, {}).get('count', 0)}" for direction in directions
+            )
+            seconds = sum(results[direction]["days"].get(day, {}).get("duration", 0) for direction in directions)
+            print(f"  {day}  {counts}  talk time {_format_duration(seconds)}")
+
+    print(f"Fetched {len(shards)} of {shard_count} day shards from Twilio in {elapsed:.1f}s", file=sys.stderr)
     return 0
 
 
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Fake OpenAI and Gemini servers with configurable latency and token rate, for load tests.
+
+Examples:
+  # 300 ms to first token, then 40 tokens per second, 30 tokens per reply
+  python scripts/fake_llm.py --port 9000 --first-token-ms 300 --tokens-per-second 40 --tokens 30
+
+Then point the app at it:
+  OPENAI_BASE_URL=http://localhost:9000/v1 GEMINI_BASE_URL=http://localhost:9000 python main.py
+
+Notes:
+- Implements streaming and non-streaming chat completions (POST /v1/chat/completions)
+  and Gemini generateContent / streamGenerateContent
+- GET /stats reports request counts
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+WORDS = ("sure", "here", "is", "a", "short", "answer", "about", "that", "question", "and", "a", "little", "more", "detail")
+
+
+def create_app(first_token_ms=300.0, tokens_per_second=50.0, tokens=30, jitter=0.1):
+    app = FastAPI()
+    app.state.requests = {"openai": 0, "gemini": 0}
+
+    def delay(seconds):
+        return max(seconds * (1 + random.uniform(-jitter, jitter)), 0)
+
+    async def generate():
+        """Yield reply tokens at the configured latency and rate"""
+        await asyncio.sleep(delay(first_token_ms / 1000))
+        for i in range(tokens):
+            if i:
+                await asyncio.sleep(delay(1 / tokens_per_second))
+            word = WORDS[i % len(WORDS)]
+            yield (word if i == 0 else " " + word) + ("." if i == tokens - 1 else "")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests["openai"] += 1
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None):
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+
+        if not body.get("stream"):
+            text = "".join([token async for token in generate()])
+            return {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": tokens, "total_tokens": tokens}
+            }
+
+        async def events():
+            async for token in generate():
+                yield f"data: {json.dumps(chunk({'content': token}))}\n\n"
+            yield f"data: {json.dumps(chunk({}, 'stop'))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    def gemini_chunk(text):
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}]}
+
+    @app.post("/{version}/models/{model_action:path}")
+    async def gemini(version: str, model_action: str, request: Request):
+        await request.body()
+        app.state.requests["gemini"] += 1
+        if model_action.endswith(":streamGenerateContent"):
+            async def events():
+                async for token in generate():
+                    yield f"data: {json.dumps(gemini_chunk(token))}\n\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        return gemini_chunk("".join([token async for token in generate()]))
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.requests
+
+    return app
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run fake OpenAI/Gemini endpoints for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--first-token-ms", type=float, default=300.0, help="Delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Token rate after the first token")
+    parser.add_argument("--tokens", type=int, default=30, help="Tokens per reply")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Random +/- fraction applied to every delay")
+    args = parser.parse_args()
+
+    app = create_app(args.first_token_ms, args.tokens_per_second, args.tokens, args.jitter)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
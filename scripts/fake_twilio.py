@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Local stub of the Twilio Calls API for testing outbound calls and campaigns offline.
+
+Examples:
+  # Accept every call
+  python scripts/fake_twilio.py --port 9100
+
+  # Reject requests beyond 5 per second with HTTP 429 and report each call
+  # as completed to its StatusCallback after 3 seconds
+  python scripts/fake_twilio.py --port 9100 --max-rps 5 --call-duration 3
+
+Then run the app with TWILIO_API_BASE=http://localhost:9100 (and any
+non-empty TWILIO_ACCOUNT_SID / TWILIO_AUTH_TOKEN / TWILIO_PHONE_NUMBER).
+
+Notes:
+- Only POST /2010-04-01/Accounts/{sid}/Calls.json is implemented
+- Status callbacks are only sent when --call-duration is set
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(max_rps=0.0, call_duration=None):
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.rejected = 0
+    window = {"second": 0, "count": 0}
+    background = set()
+
+    async def report_completed(url, call_sid):
+        await asyncio.sleep(call_duration)
+        async with httpx.AsyncClient() as client:
+            try:
+                await client.post(url, data={"CallSid": call_sid, "CallStatus": "completed"})
+            except httpx.HTTPError as e:
+                print(f"Status callback to {url} failed: {e}")
+
+    @app.post("/2010-04-01/Accounts/{account_sid}/Calls.json")
+    async def create_call(account_sid: str, request: Request):
+        form = await request.form()
+
+        if max_rps:
+            second = int(time.monotonic())
+            if window["second"] != second:
+                window["second"], window["count"] = second, 0
+            window["count"] += 1
+            if window["count"] > max_rps:
+                app.state.rejected += 1
+                return JSONResponse(
+                    status_code=429,
+                    content={"code": 20429, "message": "Too Many Requests", "status": 429}
+                )
+
+        app.state.calls += 1
+        call_sid = "CA" + uuid.uuid4().hex
+        status_callback = form.get("StatusCallback")
+        if call_duration is not None and status_callback:
+            task = asyncio.create_task(report_completed(status_callback, call_sid))
+            background.add(task)
+            task.add_done_callback(background.discard)
+
+        return JSONResponse(status_code=201, content={
+            "sid": call_sid,
+            "account_sid": account_sid,
+            "to": form.get("To"),
+            "from": form.get("From"),
+            "status": "queued",
+            "direction": "outbound-api",
+            "uri": f"/2010-04-01/Accounts/{account_sid}/Calls/{call_sid}.json"
+        })
+
+    @app.get("/stats")
+    async def stats():
+        return {"calls": app.state.calls, "rejected": app.state.rejected}
+
+    return app
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run a local stub of the Twilio Calls API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--max-rps", type=float, default=0, help="Answer HTTP 429 beyond this many calls per second (0 = unlimited)")
+    parser.add_argument("--call-duration", type=float, default=None, help="Seconds after which each call is reported completed to its StatusCallback")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.max_rps, args.call_duration), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
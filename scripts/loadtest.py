@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Load test the voice assistant with simulated ConversationRelay clients and a fake LLM.
+
+Each client opens a WebSocket to /ws, sends a `setup` frame and then a series of
+`prompt` frames, optionally interrupting some replies part way through, and
+times every turn. By default the script starts scripts/fake_llm.py and the app
+(uvicorn main:app) as subprocesses on free ports, so nothing external is called.
+
+Examples:
+  # 50 concurrent calls, 5 turns each, against the fake OpenAI backend
+  python scripts/loadtest.py --clients 50 --turns 5
+
+  # Slow Gemini upstream, 10% of replies interrupted, results saved and
+  # compared with an earlier run
+  python scripts/loadtest.py --model gemini-flash --first-token-ms 800 \
+      --interrupt-rate 0.1 --output after.json --baseline before.json
+
+  # Drive an already running server (memory is reported only with --server-pid);
+  # its aiModel is switched to --model for the run and restored afterwards
+  python scripts/loadtest.py --url ws://localhost:8080/ws --server-pid 12345
+
+Reports p50/p95/p99 turn latency and time to first token, turns and text
+frames per second, and server memory per session, as JSON on stdout (and in --output).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import websockets
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PROMPTS = (
+    "What are your opening hours?",
+    "How do I reset my password?",
+    "Can you tell me a fun fact about space?",
+    "What's a good recipe for dinner tonight?",
+    "How far away is the moon?",
+    "Can you recommend a book?",
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_kb(pid):
+    """Resident set size of a process in KiB (Linux /proc), or None"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(p):
+        return round(ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))], 1)
+
+    return {
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "mean": round(sum(ordered) / len(ordered), 1),
+        "max": round(ordered[-1], 1),
+    }
+
+
+async def wait_until_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+class Stats:
+    def __init__(self):
+        self.turn_ms = []
+        self.ttft_ms = []
+        self.frames = 0
+        self.completed = 0
+        self.interrupted = 0
+        self.errors = 0
+
+
+async def run_client(index, args, stats):
+    """One simulated call: setup, then prompts with optional interrupts"""
+    call_sid = f"CAload{index:05d}"
+    try:
+        async with websockets.connect(args.url, max_size=None) as ws:
+            await ws.send(json.dumps({
+                "type": "setup",
+                "callSid": call_sid,
+                "from": "+15550000000",
+                "to": "+15551111111",
+                "direction": "inbound"
+            }))
+            for turn in range(args.turns):
+                await asyncio.sleep(random.uniform(0, args.think_ms / 1000))
+                interrupt = random.random() < args.interrupt_rate
+                started = time.perf_counter()
+                await ws.send(json.dumps({
+                    "type": "prompt",
+                    "voicePrompt": PROMPTS[(index + turn) % len(PROMPTS)],
+                    "lang": "en-US",
+                    "last": True
+                }))
+
+                first_token_at = None
+                heard = []
+                while True:
+                    frame = json.loads(await asyncio.wait_for(ws.recv(), args.turn_timeout))
+                    if frame.get("type") != "text":
+                        continue
+                    if frame.get("token"):
+                        stats.frames += 1
+                        heard.append(frame["token"])
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            stats.ttft_ms.append((first_token_at - started) * 1000)
+                    if interrupt and heard:
+                        await ws.send(json.dumps({
+                            "type": "interrupt",
+                            "utteranceUntilInterrupt": "".join(heard),
+                            "durationUntilInterruptMs": str(int((time.perf_counter() - started) * 1000))
+                        }))
+                        stats.interrupted += 1
+                        # Give the server a moment to stop, discarding anything already in flight
+                        try:
+                            while True:
+                                await asyncio.wait_for(ws.recv(), 0.2)
+                        except asyncio.TimeoutError:
+                            pass
+                        break
+                    if frame.get("last"):
+                        stats.turn_ms.append((time.perf_counter() - started) * 1000)
+                        stats.completed += 1
+                        break
+    except Exception as e:
+        stats.errors += 1
+        print(f"Client {call_sid} failed: {e!r}", file=sys.stderr)
+
+
+async def run(args):
+    procs = []
+    server_pid = args.server_pid
+    http_base = saved_config = None
+    try:
+        if not args.url:
+            llm_port, app_port = free_port(), free_port()
+            procs.append(subprocess.Popen([
+                sys.executable, os.path.join(ROOT, "scripts", "fake_llm.py"),
+                "--port", str(llm_port),
+                "--first-token-ms", str(args.first_token_ms),
+                "--tokens-per-second", str(args.tokens_per_second),
+                "--tokens", str(args.tokens),
+            ]))
+            env = dict(
+                os.environ,
+                OPENAI_API_KEY="fake", OPENAI_BASE_URL=f"http://127.0.0.1:{llm_port}/v1",
+                GEMINI_API_KEY="fake", GEMINI_BASE_URL=f"http://127.0.0.1:{llm_port}",
+                NGROK_URL=f"127.0.0.1:{app_port}", LOG_LEVEL="WARNING",
+            )
+            server = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning"],
+                cwd=ROOT, env=env
+            )
+            procs.append(server)
+            server_pid = server.pid
+            await wait_until_ready(f"http://127.0.0.1:{llm_port}/stats")
+            http_base = f"http://127.0.0.1:{app_port}"
+            args.url = f"ws://127.0.0.1:{app_port}/ws"
+        else:
+            http_base = args.url.replace("wss://", "https://").replace("ws://", "http://").rsplit("/ws", 1)[0]
+
+        await wait_until_ready(f"{http_base}/api/config")
+        async with httpx.AsyncClient() as client:
+            config = (await client.get(f"{http_base}/api/config")).json()
+            if not procs:
+                # Someone else's server: note its config so it can be put back
+                saved_config = dict(config)
+            config["aiModel"] = args.model
+            await client.post(f"{http_base}/api/config", json=config)
+
+        baseline_rss = rss_kb(server_pid) if server_pid else None
+        stats = Stats()
+        peak_rss = baseline_rss
+
+        async def sample_memory():
+            nonlocal peak_rss
+            while True:
+                current = rss_kb(server_pid) if server_pid else None
+                if current and (peak_rss is None or current > peak_rss):
+                    peak_rss = current
+                await asyncio.sleep(0.1)
+
+        sampler = asyncio.create_task(sample_memory())
+        started = time.perf_counter()
+        await asyncio.gather(*[run_client(i, args, stats) for i in range(args.clients)])
+        duration = time.perf_counter() - started
+        sampler.cancel()
+
+        memory = None
+        if baseline_rss and peak_rss:
+            memory = {
+                "baseline_rss_kb": baseline_rss,
+                "peak_rss_kb": peak_rss,
+                "per_session_kb": round((peak_rss - baseline_rss) / args.clients, 1),
+            }
+
+        return {
+            "config": {
+                "clients": args.clients,
+                "turns": args.turns,
+                "model": args.model,
+                "interrupt_rate": args.interrupt_rate,
+                "first_token_ms": args.first_token_ms,
+                "tokens_per_second": args.tokens_per_second,
+                "tokens": args.tokens,
+            },
+            "duration_s": round(duration, 3),
+            "turns_completed": stats.completed,
+            "turns_interrupted": stats.interrupted,
+            "client_errors": stats.errors,
+            "throughput_turns_per_s": round(stats.completed / duration, 2),
+            "frames_per_s": round(stats.frames / duration, 1),
+            "turn_latency_ms": percentiles(stats.turn_ms),
+            "time_to_first_token_ms": percentiles(stats.ttft_ms),
+            "memory": memory,
+        }
+    finally:
+        if saved_config is not None:
+            try:
+                async with httpx.AsyncClient() as client:
+                    await client.post(f"{http_base}/api/config", json=saved_config)
+            except httpx.HTTPError as e:
+                print(f"Could not restore the server config: {e!r}", file=sys.stderr)
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=10)
+
+
+def compare(result, baseline):
+    """Print percentage changes of the headline numbers against an earlier run"""
+    def pick(data, path):
+        for key in path:
+            data = (data or {}).get(key)
+        return data
+
+    rows = (
+        ("turn p50 ms", ("turn_latency_ms", "p50")),
+        ("turn p95 ms", ("turn_latency_ms", "p95")),
+        ("turn p99 ms", ("turn_latency_ms", "p99")),
+        ("ttft p50 ms", ("time_to_first_token_ms", "p50")),
+        ("ttft p95 ms", ("time_to_first_token_ms", "p95")),
+        ("turns/s", ("throughput_turns_per_s",)),
+        ("KiB/session", ("memory", "per_session_kb")),
+    )
+    print("Comparison with baseline", file=sys.stderr)
+    for label, path in rows:
+        before, after = pick(baseline, path), pick(result, path)
+        if before is None or after is None:
+            continue
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"  {label}: {before} -> {after} ({change})", file=sys.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the ConversationRelay WebSocket with a fake LLM")
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent simulated calls")
+    parser.add_argument("--turns", type=int, default=5, help="Prompts per call")
+    parser.add_argument("--model", default="openai-gpt4o-mini", help="aiModel to configure (openai-* or gemini-*)")
+    parser.add_argument("--interrupt-rate", type=float, default=0.0, help="Fraction of replies interrupted after the first token")
+    parser.add_argument("--think-ms", type=float, default=200.0, help="Max random pause before each prompt")
+    parser.add_argument("--turn-timeout", type=float, default=30.0, help="Seconds to wait for a frame before failing the client")
+    parser.add_argument("--first-token-ms", type=float, default=300.0, help="Fake LLM delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Fake LLM token rate")
+    parser.add_argument("--tokens", type=int, default=30, help="Fake LLM tokens per reply")
+    parser.add_argument("--url", help="WebSocket URL of a running server (default: start one with a fake LLM)")
+    parser.add_argument("--server-pid", type=int, help="PID of the running server, for memory stats with --url")
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--baseline", help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(result, json.load(baseline))
+    return 0 if result["client_errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
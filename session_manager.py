@@ -0,0 +1,151 @@
+"""
+Lifecycle of the calls connected to this worker.
+
+Each ConversationRelay session is registered at setup and touched on every
+message it sends. A background reaper ends sessions that have been silent
+for longer than `idle_timeout` or have run past `max_duration`, and purges
+session store entries left behind by calls that never connected. New calls
+are turned away while the worker already holds `max_sessions` calls or its
+resident memory is above `max_memory_bytes`, so memory stays flat however
+long the process runs.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def resident_memory_bytes():
+    """Resident set size of this process, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Session:
+    """One connected call; `close` is an async callable that ends its WebSocket"""
+
+    __slots__ = ("call_sid", "conversation", "close", "started", "last_activity")
+
+    def __init__(self, call_sid, conversation, close):
+        self.call_sid = call_sid
+        self.conversation = conversation
+        self.close = close
+        self.started = time.monotonic()
+        self.last_activity = self.started
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+
+class SessionManager:
+    """Registry of live sessions with capacity limits and an idle-session reaper.
+
+    `purge` is an async callable run on every reaper pass that removes expired
+    session store entries and returns how many it removed. `on_reject` is
+    called with the reason ("sessions" or "memory") when a call is turned
+    away, and `on_reap` with the reason ("idle" or "duration") when a session
+    is ended by the reaper. A limit of 0 disables it.
+    """
+
+    def __init__(self, max_sessions=0, max_memory_bytes=0, idle_timeout=900, max_duration=14400,
+                 reap_interval=30, purge=None, on_reject=None, on_reap=None, memory=resident_memory_bytes):
+        self.max_sessions = max_sessions
+        self.max_memory_bytes = max_memory_bytes
+        self.idle_timeout = idle_timeout
+        self.max_duration = max_duration
+        self.reap_interval = reap_interval
+        self.purge = purge
+        self.on_reject = on_reject
+        self.on_reap = on_reap
+        self.memory = memory
+        self.sessions = {}
+        self.purged = 0
+        self._task = None
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def capacity_error(self):
+        """Why a new call can't be taken right now ("sessions" or "memory"), or None"""
+        if self.max_sessions and len(self.sessions) >= self.max_sessions:
+            return "sessions"
+        if self.max_memory_bytes:
+            rss = self.memory()
+            if rss is not None and rss >= self.max_memory_bytes:
+                return "memory"
+        return None
+
+    def admit(self):
+        """Check capacity for a new call; returns the rejection reason, or None if it can go ahead"""
+        reason = self.capacity_error()
+        if reason:
+            logger.warning("Rejecting call at capacity", extra={"reason": reason, "sessions": len(self.sessions)})
+            if self.on_reject:
+                self.on_reject(reason)
+        return reason
+
+    def open(self, call_sid, conversation, close):
+        session = Session(call_sid, conversation, close)
+        self.sessions[call_sid] = session
+        return session
+
+    def get(self, call_sid):
+        return self.sessions.get(call_sid)
+
+    def remove(self, session):
+        """Unregister a session, unless its call has since reconnected as a new session"""
+        if self.sessions.get(session.call_sid) is session:
+            del self.sessions[session.call_sid]
+
+    def expired(self, now=None):
+        """(session, reason) for every session the reaper should end"""
+        now = time.monotonic() if now is None else now
+        found = []
+        for session in self.sessions.values():
+            if self.max_duration and now - session.started >= self.max_duration:
+                found.append((session, "duration"))
+            elif self.idle_timeout and now - session.last_activity >= self.idle_timeout:
+                found.append((session, "idle"))
+        return found
+
+    async def reap(self):
+        """End expired sessions and purge stale session store entries"""
+        for session, reason in self.expired():
+            # Unregister first so the slot frees up even if the WebSocket is slow to close
+            self.remove(session)
+            logger.info("Reaping session", extra={"call_sid": session.call_sid, "reason": reason})
+            if self.on_reap:
+                self.on_reap(reason)
+            try:
+                await session.close(reason)
+            except Exception:
+                logger.exception("Error closing reaped session", extra={"call_sid": session.call_sid})
+        if self.purge:
+            try:
+                self.purged += await self.purge()
+            except Exception:
+                logger.exception("Error purging expired session store entries")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            await self.reap()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
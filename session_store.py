@@ -0,0 +1,253 @@
+"""
+Session store backends for configuration, config profiles, call metadata, conversation history
+and call-finished markers.
+
+The in-memory store keeps everything in the current process and is the
+default. The Redis store shares state between uvicorn workers and nodes, so a
+`/twiml` request served by one worker can see the call metadata written by
+`/api/call` on another.
+
+Select a backend with `create_session_store(url)`:
+  - empty / "memory://"   -> InMemorySessionStore
+  - "redis://host:6379/0" -> RedisSessionStore (requires the `redis` package)
+  - "fakeredis://"        -> RedisSessionStore over an in-process fake server
+                             (requires the `fakeredis` package; local testing only)
+"""
+
+import copy
+import json
+import time
+
+
+class SessionStore:
+    """Interface shared by every session store backend"""
+
+    async def get_config(self):
+        """Return the active configuration dict, or None if none has been saved"""
+        raise NotImplementedError
+
+    async def set_config(self, config):
+        raise NotImplementedError
+
+    async def get_profiles(self):
+        """Return every named config profile as a dict of name -> profile"""
+        raise NotImplementedError
+
+    async def set_profile(self, name, profile):
+        raise NotImplementedError
+
+    async def delete_profile(self, name):
+        """Remove a profile; returns whether it existed"""
+        raise NotImplementedError
+
+    async def get_call(self, call_sid):
+        """Return metadata stored for a call (e.g. the outbound caller's name), or None"""
+        raise NotImplementedError
+
+    async def set_call(self, call_sid, info):
+        raise NotImplementedError
+
+    async def pop_call(self, call_sid):
+        raise NotImplementedError
+
+    async def get_history(self, call_sid):
+        """Return the saved conversation messages for a call, or None"""
+        raise NotImplementedError
+
+    async def save_history(self, call_sid, messages):
+        raise NotImplementedError
+
+    async def delete_history(self, call_sid):
+        raise NotImplementedError
+
+    async def mark_call_finished(self, call_sid, status):
+        """Record that a call ended, for the dialer that placed it (possibly on another worker)"""
+        raise NotImplementedError
+
+    async def pop_finished_calls(self, call_sids):
+        """Return {call SID: status} for the given calls that have ended, removing their markers"""
+        raise NotImplementedError
+
+    async def purge_expired(self):
+        """Drop call metadata and history past their TTL; returns how many entries were removed"""
+        return 0
+
+    async def aclose(self):
+        """Release any connections held by the store"""
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local store; only suitable for a single uvicorn worker.
+
+    Call metadata and history are kept as (expires_at, value) and stop being
+    returned after `ttl` seconds, like the Redis store; `purge_expired` frees
+    them.
+    """
+
+    def __init__(self, ttl=86400):
+        self.ttl = ttl
+        self.config = None
+        self.profiles = {}
+        self.calls = {}
+        self.histories = {}
+        self.finished = {}
+
+    def _get_live(self, entries, call_sid):
+        entry = entries.get(call_sid)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return copy.deepcopy(entry[1])
+
+    def _expiring(self, value):
+        return (time.monotonic() + self.ttl, copy.deepcopy(value))
+
+    async def get_config(self):
+        return copy.deepcopy(self.config)
+
+    async def set_config(self, config):
+        self.config = copy.deepcopy(config)
+
+    async def get_profiles(self):
+        return copy.deepcopy(self.profiles)
+
+    async def set_profile(self, name, profile):
+        self.profiles[name] = copy.deepcopy(profile)
+
+    async def delete_profile(self, name):
+        return self.profiles.pop(name, None) is not None
+
+    async def get_call(self, call_sid):
+        return self._get_live(self.calls, call_sid)
+
+    async def set_call(self, call_sid, info):
+        self.calls[call_sid] = self._expiring(info)
+
+    async def pop_call(self, call_sid):
+        info = self._get_live(self.calls, call_sid)
+        self.calls.pop(call_sid, None)
+        return info
+
+    async def get_history(self, call_sid):
+        return self._get_live(self.histories, call_sid)
+
+    async def save_history(self, call_sid, messages):
+        self.histories[call_sid] = self._expiring(messages)
+
+    async def delete_history(self, call_sid):
+        self.histories.pop(call_sid, None)
+
+    async def mark_call_finished(self, call_sid, status):
+        self.finished[call_sid] = self._expiring(status)
+
+    async def pop_finished_calls(self, call_sids):
+        found = {}
+        for call_sid in call_sids:
+            status = self._get_live(self.finished, call_sid)
+            if status is not None:
+                found[call_sid] = status
+                del self.finished[call_sid]
+        return found
+
+    async def purge_expired(self):
+        now = time.monotonic()
+        removed = 0
+        for entries in (self.calls, self.histories, self.finished):
+            for call_sid in [sid for sid, (expires_at, _) in entries.items() if expires_at <= now]:
+                del entries[call_sid]
+                removed += 1
+        return removed
+
+
+class RedisSessionStore(SessionStore):
+    """Store backed by Redis so state is shared across workers and nodes.
+
+    Call metadata and history keys expire after `ttl` seconds, so calls that
+    never connect don't leave entries behind forever; Redis removes them
+    itself, so `purge_expired` has nothing to do.
+    """
+
+    def __init__(self, client, prefix="cr", ttl=86400):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _key(self, *parts):
+        return ":".join((self.prefix,) + parts)
+
+    async def _get_json(self, key):
+        value = await self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    async def get_config(self):
+        return await self._get_json(self._key("config"))
+
+    async def set_config(self, config):
+        await self.client.set(self._key("config"), json.dumps(config))
+
+    async def get_profiles(self):
+        profiles = await self.client.hgetall(self._key("profiles"))
+        return {name: json.loads(value) for name, value in profiles.items()}
+
+    async def set_profile(self, name, profile):
+        await self.client.hset(self._key("profiles"), name, json.dumps(profile))
+
+    async def delete_profile(self, name):
+        return bool(await self.client.hdel(self._key("profiles"), name))
+
+    async def get_call(self, call_sid):
+        return await self._get_json(self._key("call", call_sid))
+
+    async def set_call(self, call_sid, info):
+        await self.client.set(self._key("call", call_sid), json.dumps(info), ex=self.ttl)
+
+    async def pop_call(self, call_sid):
+        key = self._key("call", call_sid)
+        info = await self._get_json(key)
+        await self.client.delete(key)
+        return info
+
+    async def get_history(self, call_sid):
+        return await self._get_json(self._key("history", call_sid))
+
+    async def save_history(self, call_sid, messages):
+        await self.client.set(self._key("history", call_sid), json.dumps(messages), ex=self.ttl)
+
+    async def delete_history(self, call_sid):
+        await self.client.delete(self._key("history", call_sid))
+
+    async def mark_call_finished(self, call_sid, status):
+        await self.client.set(self._key("finished", call_sid), status, ex=self.ttl)
+
+    async def pop_finished_calls(self, call_sids):
+        if not call_sids:
+            return {}
+        keys = [self._key("finished", call_sid) for call_sid in call_sids]
+        found = {call_sid: status for call_sid, status in zip(call_sids, await self.client.mget(keys)) if status is not None}
+        if found:
+            await self.client.delete(*(self._key("finished", call_sid) for call_sid in found))
+        return found
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def create_session_store(url="", ttl=86400):
+    """Create the session store backend for the given URL"""
+    if not url or url.startswith("memory://"):
+        return InMemorySessionStore(ttl=ttl)
+
+    if url.startswith("fakeredis://"):
+        try:
+            from fakeredis import FakeAsyncRedis
+        except ImportError as exc:
+            raise RuntimeError("SESSION_STORE_URL uses fakeredis:// but the 'fakeredis' package is not installed") from exc
+        return RedisSessionStore(FakeAsyncRedis(decode_responses=True), ttl=ttl)
+
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("SESSION_STORE_URL points at Redis but the 'redis' package is not installed. Run: pip install redis") from exc
+        return RedisSessionStore(redis.from_url(url, decode_responses=True), ttl=ttl)
+
+    raise ValueError(f"Unsupported SESSION_STORE_URL '{url}'")
@@ -0,0 +1,292 @@
+"""
+Streaming post-processing of AI replies for text-to-speech.
+
+`SentenceChunker` cuts streamed tokens at sentence boundaries (or at clause
+boundaries once a clause is long enough) so TTS can start speaking the first
+sentence while the rest is still being generated, and so normalization never
+sees a number or a markdown span split across tokens. `normalize_for_speech`
+then rewrites each chunk for a voice: digits become words, symbols such as
+`>` and `/` are read out, and markdown, bullets and emojis are removed. Every
+character is scanned once by the chunker and each chunk goes through a fixed
+number of regex passes, so the cost stays linear in the length of the reply.
+"""
+
+import re
+
+SENTENCE_END = ".!?"
+CLAUSE_END = ",;:"
+CLOSERS = "\"')]”’"
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "e.g", "i.e", "approx", "no"}
+
+ONES = (
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen",
+)
+TENS = ("", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety")
+SCALES = ((10 ** 12, "trillion"), (10 ** 9, "billion"), (10 ** 6, "million"), (1000, "thousand"))
+ORDINAL_WORDS = {
+    "one": "first", "two": "second", "three": "third", "five": "fifth", "eight": "eighth",
+    "nine": "ninth", "twelve": "twelfth",
+}
+CURRENCIES = {"$": ("dollar", "dollars", "cent", "cents"), "£": ("pound", "pounds", "penny", "pence"),
+              "€": ("euro", "euros", "cent", "cents")}
+
+
+def number_to_words(n):
+    """Spell out a non-negative integer, e.g. 1234 -> one thousand two hundred thirty-four"""
+    if n < 20:
+        return ONES[n]
+    if n < 100:
+        return TENS[n // 10] + ("-" + ONES[n % 10] if n % 10 else "")
+    if n < 1000:
+        return ONES[n // 100] + " hundred" + (" " + number_to_words(n % 100) if n % 100 else "")
+    if n >= 1000 * 10 ** 12:
+        return digits_to_words(str(n))
+    for scale, name in SCALES:
+        if n >= scale:
+            rest = n % scale
+            return number_to_words(n // scale) + " " + name + (" " + number_to_words(rest) if rest else "")
+    return ""
+
+
+def digits_to_words(digits):
+    """Read digits one at a time, e.g. 905 -> nine zero five"""
+    return " ".join(ONES[int(d)] for d in digits if d.isdigit())
+
+
+def ordinal_to_words(n):
+    words = number_to_words(n)
+    head, sep, last = words.rpartition("-" if words.rfind("-") > words.rfind(" ") else " ")
+    if last in ORDINAL_WORDS:
+        last = ORDINAL_WORDS[last]
+    elif last.endswith("y"):
+        last = last[:-1] + "ieth"
+    else:
+        last += "th"
+    return head + sep + last
+
+
+def year_to_words(n):
+    """Read a year the way people say it, e.g. 1999 -> nineteen ninety-nine, 2024 -> twenty twenty-four"""
+    if 2000 <= n < 2010 or n % 1000 == 0:
+        return number_to_words(n)
+    high, low = divmod(n, 100)
+    if low == 0:
+        return number_to_words(high) + " hundred"
+    return number_to_words(high) + " " + ("oh " + ONES[low] if low < 10 else number_to_words(low))
+
+
+def decimal_to_words(text):
+    """Spell out a number with optional thousands separators and decimals, e.g. 1,250.5"""
+    whole, _, fraction = text.replace(",", "").partition(".")
+    words = number_to_words(int(whole)) if whole else "zero"
+    if fraction:
+        words += " point " + digits_to_words(fraction)
+    return words
+
+
+_PHONE = re.compile(r"(?<!\d)(?:\+?1[\s.-]?)?\(?(\d{3})\)?[\s.-]?(\d{3})[\s.-](\d{4})(?!\d)")
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+_CURRENCY = re.compile(r"([$£€])(" + _NUMBER + r")(\s?(?:thousand|million|billion|trillion)\b)?")
+_PERCENT = re.compile(r"(" + _NUMBER + r")\s?%")
+_ORDINAL = re.compile(r"\b(\d+)(?:st|nd|rd|th)\b", re.IGNORECASE)
+_TIME = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)(?!\d)(?:\s?([AaPp])\.?[Mm]\b(?:\.(?=,|\s+[a-z]))?)?")
+_RATIO = re.compile(r"(?<![\d:])(\d+):(\d+)(?![\d:])")
+# A four-digit number is only read as a year where the words around it say it is one:
+# "in 1999", "since 2010", "March 5, 2024", or followed by a comma ("1999, the year...")
+_MONTHS = "january|february|march|april|may|june|july|august|september|october|november|december"
+_YEAR = re.compile(
+    r"(\b(?:in|since|by|from|until|till|before|after|during|circa|year)\s+"
+    r"|\b(?:" + _MONTHS + r")\s+(?:\d{1,2}(?:st|nd|rd|th)?,?\s+)?)?"
+    r"(?<![A-Za-z\d.,])(1[1-9]\d\d|20\d\d)"
+    r"(?(1)(?!\d|[.,]\d)|(?=,(?!\d)))",
+    re.IGNORECASE
+)
+_DECADE = re.compile(r"(?<![A-Za-z\d.,])(1[1-9]\d0|20\d0)s\b")
+_MINUS = re.compile(r"(?<![\w])-(?=\d)")
+# Digits inside a word or a dotted identifier (model names, "MP3", "v1.2.3") are left for TTS to read as written
+_DECIMAL = re.compile(r"(?<![A-Za-z\d.])(?:" + _NUMBER + r")(?!\.\d)")
+_HASH_NUMBER = re.compile(r"#(?=\d)")
+
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_LIST_MARKER = re.compile(r"^[ \t]*(?:[-*•+>]|\d+[.)]|#{1,6})[ \t]+", re.MULTILINE)
+_UNTERMINATED_LINE = re.compile(r"([^\s.!?:;,])[ \t]*\n")
+_EMOJI = re.compile(
+    "[\U0001F000-\U0001FAFF\u2600-\u27BF\u2B00-\u2BFF\uFE0F\u200D\u20E3]"
+)
+# Symbols that carry meaning are read as words rather than dropped
+_AROUND_THE_CLOCK = re.compile(r"\b24/7\b")
+_PER = re.compile(r"(?<=\d)(\s?[A-Za-z]{0,3})/(?=[A-Za-z])")
+_SLASH = re.compile(r"(?<=\w)/(?=\w)")
+COMPARISONS = {
+    "->": " to ", "=>": " to ", "→": " to ", "<=": " less than or equal to ", "≤": " less than or equal to ",
+    ">=": " greater than or equal to ", "≥": " greater than or equal to ", "!=": " not equal to ",
+    "≠": " not equal to ", "==": " equals ", "=": " equals ", "<": " less than ", ">": " greater than ",
+}
+_COMPARISON = re.compile("|".join(re.escape(symbol) for symbol in sorted(COMPARISONS, key=len, reverse=True)))
+# Arithmetic only where the symbol can't be markdown emphasis: "3*4", "3 * 4", "x^2"
+_TIMES = re.compile(r"(?<=\d)\s?[*×]\s?(?=\d)|(?<=[\w)]) [*×] (?=[\w(])")
+_POWER = re.compile(r"(?<=[\w)])\s?\^\s?(?=[\w(])")
+_SYMBOLS = re.compile(r"[*_`~|^#\\{}\[\]]")
+_WHITESPACE = re.compile(r"\s+")
+_SPACE_BEFORE_PUNCTUATION = re.compile(r"(?<=\S)\s+(?=[.,!?;:])")
+
+
+def _currency(match):
+    singular, plural, minor_singular, minor_plural = CURRENCIES[match.group(1)]
+    whole, _, cents = match.group(2).replace(",", "").partition(".")
+    scale = (match.group(3) or "").strip()
+    if scale:
+        return decimal_to_words(match.group(2)) + " " + scale + " " + plural
+    amount = int(whole)
+    words = number_to_words(amount) + " " + (singular if amount == 1 else plural)
+    if cents and int(cents.ljust(2, "0")):
+        minor = int(cents.ljust(2, "0"))
+        words += " and " + number_to_words(minor) + " " + (minor_singular if minor == 1 else minor_plural)
+    return words
+
+
+def _time(match):
+    hours, minutes, meridiem = int(match.group(1)), int(match.group(2)), match.group(3)
+    words = number_to_words(hours)
+    if minutes:
+        words += " " + ("oh " + ONES[minutes] if minutes < 10 else number_to_words(minutes))
+    if meridiem:
+        return words + " " + meridiem.upper() + "M"
+    return words if minutes else words + " o'clock"
+
+
+def _decade(match):
+    words = year_to_words(int(match.group(1)))
+    return words[:-1] + "ies" if words.endswith("y") else words + "s"
+
+
+def _decimal(match):
+    words = decimal_to_words(match.group(0))
+    # Keep a unit written straight after the number as a separate word ("5pm" -> "five pm")
+    return words + " " if match.string[match.end():match.end() + 1].isalpha() else words
+
+
+def normalize_for_speech(text):
+    """Rewrite a chunk of model output so TTS reads it naturally"""
+    # Markdown structure: links, list markers and headings; lines get a pause
+    text = _LINK.sub(r"\1", text)
+    text = _LIST_MARKER.sub("", text)
+    text = _UNTERMINATED_LINE.sub(r"\1.\n", text)
+    text = _EMOJI.sub("", text)
+
+    # Slashes and arithmetic, before numbers become words: "24/7", "$5/month", "60 km/h", "3 * 4", "x^2"
+    text = _AROUND_THE_CLOCK.sub("twenty-four seven", text)
+    text = _PER.sub(r"\1 per ", text)
+    text = _SLASH.sub(" slash ", text)
+    text = _TIMES.sub(" times ", text)
+    text = _POWER.sub(" to the power of ", text)
+
+    # Numbers, most specific pattern first
+    text = _PHONE.sub(lambda m: ", ".join(digits_to_words(g) for g in m.groups()), text)
+    text = _CURRENCY.sub(_currency, text)
+    text = _PERCENT.sub(lambda m: decimal_to_words(m.group(1)) + " percent", text)
+    # Before ordinals, so "March 5th, 2024" still has its day in digits
+    text = _YEAR.sub(lambda m: (m.group(1) or "") + year_to_words(int(m.group(2))), text)
+    text = _DECADE.sub(_decade, text)
+    text = _ORDINAL.sub(lambda m: ordinal_to_words(int(m.group(1))), text)
+    text = _TIME.sub(_time, text)
+    text = _RATIO.sub(r"\1 to \2", text)
+    text = _HASH_NUMBER.sub("number ", text)
+    text = _MINUS.sub("minus ", text)
+    text = _DECIMAL.sub(_decimal, text)
+
+    # Remaining symbols TTS would read out or stumble over
+    text = text.replace("&", " and ").replace("@", " at ")
+    text = _COMPARISON.sub(lambda m: COMPARISONS[m.group(0)], text)
+    text = _SYMBOLS.sub("", text)
+    text = _SPACE_BEFORE_PUNCTUATION.sub("", text)
+    return _WHITESPACE.sub(" ", text)
+
+
+class SentenceChunker:
+    """Cut streamed text into complete sentences, or clauses once `clause_min_chars` long.
+
+    Feed tokens as they arrive; `feed` returns the chunks completed so far and
+    `flush` returns whatever is left at the end of the reply. Text without any
+    boundary is cut at a space after `max_chars`.
+    """
+
+    def __init__(self, clause_min_chars=40, max_chars=250):
+        self.clause_min_chars = clause_min_chars
+        self.max_chars = max_chars
+        self.buffer = ""
+        self.scanned = 0  # Characters of `buffer` already checked for boundaries
+
+    def feed(self, text):
+        buf = self.buffer + text
+        chunks = []
+        start = 0
+        i = self.scanned
+        while i < len(buf):
+            char = buf[i]
+            end = None
+            if char == "\n":
+                end = i + 1
+            elif char in SENTENCE_END or char in CLAUSE_END:
+                j = i + 1
+                while j < len(buf) and buf[j] in CLOSERS:
+                    j += 1
+                if j == len(buf):
+                    break  # The next character decides whether this is a boundary
+                if buf[j].isspace():
+                    if char in SENTENCE_END:
+                        if not self._is_abbreviation(buf, start, i):
+                            end = j
+                    elif j - start >= self.clause_min_chars:
+                        end = j
+                i = j - 1
+            elif i - start >= self.max_chars and char.isspace():
+                end = i
+
+            # Blank lines stay at the front of the next chunk so the spacing survives
+            if end is not None and buf[start:end].strip():
+                chunks.append(buf[start:end])
+                start = end
+            i += 1
+
+        self.buffer = buf[start:]
+        self.scanned = i - start
+        return chunks
+
+    def flush(self):
+        chunk, self.buffer, self.scanned = self.buffer, "", 0
+        return chunk
+
+    @staticmethod
+    def _is_abbreviation(buf, start, i):
+        """Whether the period at `i` ends a list number ("1.") or a known abbreviation ("Dr.")"""
+        word_start = i
+        while word_start > start and not buf[word_start - 1].isspace():
+            word_start -= 1
+        word = buf[word_start:i]
+        if word.isdigit():
+            line_start = buf.rfind("\n", start, i) + 1
+            return not buf[max(line_start, start):word_start].strip()
+        return word.lower() in ABBREVIATIONS
+
+
+def split_for_speech(text, clause_min_chars=40, max_chars=250):
+    """Chunk and normalize a complete reply"""
+    chunker = SentenceChunker(clause_min_chars, max_chars)
+    chunks = chunker.feed(text)
+    chunks.append(chunker.flush())
+    return [spoken for spoken in map(normalize_for_speech, chunks) if spoken.strip()]
+
+
+async def speech_chunks(tokens, clause_min_chars=40, max_chars=250):
+    """Re-chunk an async stream of model tokens into normalized, speakable pieces"""
+    chunker = SentenceChunker(clause_min_chars, max_chars)
+    async for token in tokens:
+        for chunk in chunker.feed(token):
+            spoken = normalize_for_speech(chunk)
+            if spoken.strip():
+                yield spoken
+    spoken = normalize_for_speech(chunker.flush())
+    if spoken.strip():
+        yield spoken
@@ -0,0 +1,58 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from speech import normalize_for_speech  # noqa: E402
+
+CASES = [
+    # Numbers, money and percentages
+    ("It costs $5.", "It costs five dollars."),
+    ("It costs $2,048.", "It costs two thousand forty-eight dollars."),
+    ("$1.5 million", "one point five million dollars"),
+    ("About 45% of callers.", "About forty-five percent of callers."),
+    ("2048 bytes", "two thousand forty-eight bytes"),
+    ("1500 people came.", "one thousand five hundred people came."),
+    ("It costs 5.5 dollars.", "It costs five point five dollars."),
+    ("the 3rd time", "the third time"),
+    ("call 555-123-4567", "call five five five, one two three, four five six seven"),
+    # Times and ratios
+    ("at 12:30", "at twelve thirty"),
+    ("at 7:05", "at seven oh five"),
+    ("Call at 9:00.", "Call at nine o'clock."),
+    ("We open at 9:30am and close at 5:00pm.", "We open at nine thirty AM and close at five PM."),
+    ("at 9:30 a.m. sharp", "at nine thirty AM sharp"),
+    ("5pm", "five pm"),
+    ("mix 1:2 with water", "mix one to two with water"),
+    # Years, only where the wording says so
+    ("In 1999 we opened.", "In nineteen ninety-nine we opened."),
+    ("since 2010 it grew", "since twenty ten it grew"),
+    ("March 5, 2024 was a Tuesday.", "March five, twenty twenty-four was a Tuesday."),
+    ("on March 5th, 2024.", "on March fifth, twenty twenty-four."),
+    ("Founded 1850, it is old.", "Founded eighteen fifty, it is old."),
+    ("the 1990s", "the nineteen nineties"),
+    # Symbols are read, not dropped
+    ("A > B", "A greater than B"),
+    ("x >= 5", "x greater than or equal to five"),
+    ("3 * 4 = 12", "three times four equals twelve"),
+    ("x^2", "x to the power of two"),
+    ("We're open 24/7.", "We're open twenty-four seven."),
+    ("$5/month", "five dollars per month"),
+    ("salt & pepper", "salt and pepper"),
+    # Identifiers are left as written
+    ("v1.2.3", "v1.2.3"),
+    ("gpt4o", "gpt4o"),
+    # Markdown and emojis are removed
+    ("this is *very* good", "this is very good"),
+    ("**Bold** text", "Bold text"),
+    ("See [the docs](https://example.com).", "See the docs."),
+    ("- first\n- second", "first. second"),
+    ("Great! 🎉", "Great!"),
+]
+
+
+@pytest.mark.parametrize("text, spoken", CASES)
+def test_normalize_for_speech(text, spoken):
+    assert normalize_for_speech(text).strip() == spoken
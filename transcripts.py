@@ -0,0 +1,187 @@
+"""
+Durable, append-only sink for call transcripts and per-turn metrics.
+
+Records are put on a bounded in-memory queue without blocking; a background
+thread takes them off in batches and appends them to a JSONL file (rotated by
+size) or a SQLite database, so disk I/O never runs on the event loop. When the
+queue is full, new records are dropped and counted rather than slowing a call
+down.
+
+Durability is a trade-off set by `fsync`:
+  always    fsync after every batch (SQLite: synchronous=FULL)
+  interval  fsync at most every `fsync_interval` seconds (default; SQLite: NORMAL)
+  never     leave flushing to the OS (SQLite: synchronous=OFF)
+
+Two record types are written: "turn" (prompt, response, model, outcome,
+latencies, interrupt flag) and "call" (the full conversation when a call
+ends).
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "interval", "never")
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+class JsonlWriter:
+    """Appends one JSON object per line, rotating to path.1, path.2, ... beyond `max_bytes`"""
+
+    def __init__(self, path, max_bytes=100 * 1024 * 1024, backups=10):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write_batch(self, records):
+        self.file.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+        self.file.flush()
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+
+    def _rotate(self):
+        self.sync()
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self.file.close()
+
+
+class SqliteWriter:
+    """Appends records to a `records` table; the full record is kept as JSON in `data`"""
+
+    def __init__(self, path, fsync="interval"):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=" + {"always": "FULL", "interval": "NORMAL", "never": "OFF"}[fsync])
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "ts REAL, type TEXT, call_sid TEXT, model TEXT, outcome TEXT, data TEXT)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS records_call ON records (call_sid)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS records_ts ON records (ts)")
+
+    def write_batch(self, records):
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                [(r.get("ts"), r.get("type"), r.get("call_sid"), r.get("model"), r.get("outcome"),
+                  json.dumps(r, default=str)) for r in records]
+            )
+
+    def sync(self):
+        self.db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        self.db.close()
+
+
+class TranscriptSink:
+    """Bounded queue in front of a batching background writer"""
+
+    def __init__(self, path, max_queue=10000, batch_size=200, flush_interval=1.0,
+                 fsync="interval", fsync_interval=5.0, max_bytes=100 * 1024 * 1024, backups=10):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_POLICIES)}, not '{fsync}'")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        if path.endswith(SQLITE_SUFFIXES):
+            self.writer = SqliteWriter(path, fsync)
+        else:
+            self.writer = JsonlWriter(path, max_bytes, backups)
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._stop = object()
+        self._last_sync = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, record):
+        """Queue a record without blocking; returns False if it had to be dropped"""
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def pending(self):
+        return self.queue.qsize()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+                while True:
+                    if item is self._stop:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    item = self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        try:
+            self.writer.write_batch(batch)
+            self.written += len(batch)
+            now = time.monotonic()
+            if self.fsync == "always" or (self.fsync == "interval" and now - self._last_sync >= self.fsync_interval):
+                self.writer.sync()
+                self._last_sync = now
+        except Exception:
+            self.errors += len(batch)
+            logger.exception("Error writing transcript records", extra={"records": len(batch)})
+
+    def close(self, timeout=10.0):
+        """Write everything still queued, sync and close the file"""
+        if not self._thread.is_alive():
+            return
+        # Blocks only if the queue is full, i.e. until the writer has made room
+        self.queue.put(self._stop)
+        self._thread.join(timeout)
+        try:
+            if self.fsync != "never":
+                self.writer.sync()
+            self.writer.close()
+        except Exception:
+            logger.exception("Error closing transcript sink")
+
+
+def create_transcript_sink(path, **options):
+    """Create a sink for TRANSCRIPTS_PATH, or None when transcripts are disabled"""
+    if not path:
+        return None
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return TranscriptSink(path, **options)